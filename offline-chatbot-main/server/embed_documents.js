@@ -7,6 +7,7 @@ const chunksPath = "E:/chatbot_data/chunks/chunks.json";
 const vectorDir = "E:/chatbot_data/vectorstore";
 const vectorIndexPath = path.join(vectorDir, "vector_index.json");
 const textMapPath = path.join(vectorDir, "text_map.json");
+const batchSize = Number(process.env.EMBED_BATCH_SIZE || 64);
 
 async function generateVectorStore() {
   // Load chunks
@@ -39,21 +40,6 @@ async function generateVectorStore() {
     process.exit(1);
   }
 
-  // Embed texts
-  const vectors = [];
-  for (let i = 0; i < texts.length; i++) {
-    try {
-      const output = await embedder(texts[i], { pooling: "mean", normalize: true });
-      const vector = Array.isArray(output[0]) ? output[0] : Object.values(output[0].data);
-      vectors.push(vector);
-      if ((i + 1) % 10 === 0 || i === texts.length - 1) {
-        console.log(`✅ Embedded ${i + 1}/${texts.length}`);
-      }
-    } catch (err) {
-      console.warn(`⚠️ Error embedding text at index ${i}:`, err.message);
-    }
-  }
-
   // Ensure directory
   try {
     if (!fs.existsSync(vectorDir)) {
@@ -65,13 +51,40 @@ async function generateVectorStore() {
     process.exit(1);
   }
 
+  // Embed texts in batches, streaming vectors and the text map to disk as we go
+  const vectorOut = fs.createWriteStream(vectorIndexPath, "utf8");
+  const textMapOut = fs.createWriteStream(textMapPath, "utf8");
+  vectorOut.write("[");
+  textMapOut.write("{");
+  const started = Date.now();
+  let written = 0;
+  for (let start = 0; start < texts.length; start += batchSize) {
+    const batch = texts.slice(start, start + batchSize);
+    try {
+      const output = await embedder(batch, { pooling: "mean", normalize: true });
+      const vectors = output.tolist();
+      for (let j = 0; j < vectors.length; j++) {
+        const sep = written === 0 ? "\n" : ",\n";
+        vectorOut.write(sep + JSON.stringify(vectors[j]));
+        textMapOut.write(sep + `  ${JSON.stringify(String(written))}: ${JSON.stringify(batch[j])}`);
+        written++;
+      }
+    } catch (err) {
+      console.warn(`⚠️ Error embedding texts ${start}-${start + batch.length - 1}:`, err.message);
+    }
+    const rate = written / Math.max((Date.now() - started) / 1000, 0.001);
+    console.log(`✅ Embedded ${Math.min(start + batch.length, texts.length)}/${texts.length} (${rate.toFixed(1)} chunks/s)`);
+  }
+  vectorOut.write("\n]\n");
+  textMapOut.write("\n}\n");
+
   // Save results
   try {
-    fs.writeFileSync(vectorIndexPath, JSON.stringify(vectors, null, 2), "utf8");
+    await Promise.all([
+      new Promise((resolve, reject) => vectorOut.end(resolve).on("error", reject)),
+      new Promise((resolve, reject) => textMapOut.end(resolve).on("error", reject)),
+    ]);
     console.log("✅ Saved:", vectorIndexPath);
-
-    const textMap = Object.fromEntries(texts.map((t, i) => [i, t]));
-    fs.writeFileSync(textMapPath, JSON.stringify(textMap, null, 2), "utf8");
     console.log("✅ Saved:", textMapPath);
   } catch (err) {
     console.error("❌ Failed to save vectorstore:", err.message);
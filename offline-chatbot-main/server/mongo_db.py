@@ -1,42 +1,245 @@
-from pymongo import MongoClient, errors
+# server/mongo_db.py
+#
+# Chat logging to MongoDB off the request path. store_chat() only puts the
+# record on a bounded in-process queue; a background thread writes batches
+# with insert_many once CHATLOG_BATCH_SIZE records are waiting or
+# CHATLOG_FLUSH_SECONDS have passed.
+#
+# When Mongo is down or slow (or the queue is full) records are appended to
+# CHATLOG_SPILL_PATH as JSON lines instead of being dropped, and replayed
+# into Mongo once it answers again. Each record gets its _id before it is
+# queued, so a replay that is interrupted and repeated inserts nothing twice.
+#
+# The writer also creates the (conversation_id, timestamp) index that
+# conversation history is read through (server/utils/conversation_store.py).
+
+import os
+import time
+import queue
+import threading
 from datetime import datetime
+from bson import ObjectId, json_util
+from pymongo import MongoClient, ASCENDING, errors
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "2000"))
+CHATLOG_QUEUE_SIZE = int(os.getenv("CHATLOG_QUEUE_SIZE", "10000"))
+CHATLOG_BATCH_SIZE = int(os.getenv("CHATLOG_BATCH_SIZE", "500"))
+CHATLOG_FLUSH_SECONDS = float(os.getenv("CHATLOG_FLUSH_SECONDS", "1.0"))
+CHATLOG_SPILL_PATH = os.getenv("CHATLOG_SPILL_PATH", "E:/chatbot_data/chat_log_spill.jsonl")
+RETRY_SECONDS = 10  # how long to leave Mongo alone after a failed write
 
-# Initialize MongoDB client
+# Initialize MongoDB client. Connecting is lazy, and the short timeouts keep
+# a dead server from stalling the writer for pymongo's default 30s.
 try:
-    client = MongoClient("mongodb://localhost:27017/")
+    client = MongoClient(
+        MONGO_URI,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_TIMEOUT_MS * 5,
+    )
     db = client["chatbot_db"]
     collection = db["chats"]
-    print("✅ MongoDB connected successfully.")
-except errors.ConnectionFailure as e:
-    print(f"❌ MongoDB connection failed: {e}")
+except errors.PyMongoError as e:
+    print(f"❌ MongoDB client could not be created: {e}")
     client = None
     collection = None
 
-def store_chat(conversation_id, user_msg, bot_msg, lang_iso):
+
+class ChatLogWriter:
+    """Batches chat records into `collection`, spilling to a local file when it can't."""
+
+    def __init__(self, collection, spill_path=CHATLOG_SPILL_PATH, max_queue=CHATLOG_QUEUE_SIZE,
+                 batch_size=CHATLOG_BATCH_SIZE, flush_seconds=CHATLOG_FLUSH_SECONDS):
+        self.collection = collection
+        self.spill_path = spill_path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._close_lock = threading.Lock()  # nothing is queued behind close()'s sentinel
+        self._retry_at = 0.0
+        self._closed = False
+        self._indexed = False
+        self._reachable = False  # the last Mongo call succeeded; spilled chats are only replayed then
+        self.written = 0
+        self.batches = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.failures = 0
+        self._thread = threading.Thread(target=self._run, name="chat-log-writer", daemon=True)
+        self._thread.start()
+
+    # -------------------- caller side --------------------
+    def put(self, record):
+        """Queue `record` for writing; never blocks."""
+        record.setdefault("_id", ObjectId())
+        with self._close_lock:
+            if not self._closed:
+                try:
+                    self._queue.put_nowait(record)
+                    return
+                except queue.Full:
+                    pass
+        self._spill([record])
+
+    def close(self, timeout=10):
+        """Write out everything queued, then stop the writer thread."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)  # may wait for the writer to make room
+        self._thread.join(timeout)
+
+    # -------------------- writer side --------------------
+    def _run(self):
+        while True:
+            batch, stop = self._next_batch()
+            if batch:
+                self._flush(batch)
+            if stop:
+                return
+            if self._mongo_usable() and not self._indexed:
+                self._ensure_indexes()
+            if self._reachable and self._mongo_usable():
+                self._replay()
+
+    def _next_batch(self):
+        """Up to batch_size records, waiting at most flush_seconds after the first."""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = self.flush_seconds if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if record is None:
+                return batch, True
+            batch.append(record)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_seconds
+        return batch, False
+
+    def _mongo_usable(self):
+        return self.collection is not None and time.monotonic() >= self._retry_at
+
+    def _ensure_indexes(self):
+        if self._indexed:
+            return
+        try:
+            self.collection.create_index([("conversation_id", ASCENDING), ("timestamp", ASCENDING)])
+        except errors.PyMongoError as e:
+            print(f"⚠️ Could not create chat history index, will retry: {e}")
+            self._reachable = False
+            self._retry_at = time.monotonic() + RETRY_SECONDS
+            return
+        self._indexed = self._reachable = True
+
+    def _insert(self, records):
+        """insert_many, treating records that are already stored as written."""
+        try:
+            self.collection.insert_many(records, ordered=False)
+        except errors.BulkWriteError as e:
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+    def _flush(self, batch):
+        if not self._mongo_usable():
+            self._spill(batch)
+            return
+        try:
+            self._insert(batch)
+        except errors.PyMongoError as e:
+            print(f"❌ Failed to write {len(batch)} chats, spilling to {self.spill_path}: {e}")
+            self.failures += 1
+            self._reachable = False
+            self._retry_at = time.monotonic() + RETRY_SECONDS
+            self._spill(batch)
+            return
+        self._reachable = True
+        self.written += len(batch)
+        self.batches += 1
+
+    # -------------------- spill file --------------------
+    def _spill(self, records):
+        lines = "".join(json_util.dumps(record) + "\n" for record in records)
+        with self._spill_lock:
+            try:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError as e:
+                print(f"❌ Could not spill {len(records)} chats, dropping them: {e}")
+                return
+            self.spilled += len(records)
+
+    def _replay(self):
+        """Move spilled records into Mongo, then remove the spill file."""
+        replay_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            # A .replay file left by an interrupted run is finished first
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        with open(replay_path, "r", encoding="utf-8") as f:
+            records = [json_util.loads(line) for line in f if line.strip()]
+        try:
+            for i in range(0, len(records), self.batch_size):
+                self._insert(records[i:i + self.batch_size])
+        except errors.PyMongoError as e:
+            print(f"⚠️ Replaying spilled chats failed, will retry after the next successful write: {e}")
+            self.failures += 1
+            self._reachable = False
+            self._retry_at = time.monotonic() + RETRY_SECONDS
+            return
+        os.remove(replay_path)
+        self.replayed += len(records)
+        print(f"📥 Replayed {len(records)} spilled chats into the database.")
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "failures": self.failures,
+            "mongo_backoff": self.collection is not None and not self._mongo_usable(),
+        }
+
+
+chat_log = ChatLogWriter(collection)
+
+
+def store_chat(conversation_id, user_msg, bot_msg, lang_iso, retrieval=None):
     """
-    Stores a single chat message in the MongoDB collection.
+    Queues a single chat message for the MongoDB collection. Returns the
+    record immediately; it is written by the background writer.
 
     Args:
         conversation_id (str): Unique ID for the conversation.
         user_msg (str): User's message.
         bot_msg (str): Bot's response.
         lang_iso (str): Language ISO code (e.g., 'en', 'hi').
+        retrieval (dict): Optional retrieval gate decision for this turn.
     """
-    if collection:
-        chat = {
-            "conversation_id": conversation_id,
-            "user": user_msg,
-            "assistant": bot_msg,
-            "language": lang_iso,
-            "timestamp": datetime.utcnow()
-        }
-        try:
-            collection.insert_one(chat)
-            print("📥 Chat inserted into database.")
-        except errors.PyMongoError as e:
-            print(f"❌ Failed to insert chat: {e}")
-    else:
-        print("⚠️ No MongoDB collection available. Skipping insert.")
+    chat = {
+        "conversation_id": conversation_id,
+        "user": user_msg,
+        "assistant": bot_msg,
+        "language": lang_iso,
+        "timestamp": datetime.utcnow()
+    }
+    if retrieval is not None:
+        chat["retrieval"] = retrieval
+    chat_log.put(chat)
+    return chat
 
 def get_collection():
     """
@@ -0,0 +1,147 @@
+# server/utils/answer_cache.py
+#
+# Semantic answer cache: English answers keyed by the embedding of the
+# English query, in a small exact FAISS index of their own. A new question
+# whose embedding is within ANSWER_CACHE_THRESHOLD cosine similarity of a
+# cached one (asked less than ANSWER_CACHE_TTL seconds ago) gets the cached
+# answer, skipping web search and generation. Because queries are translated
+# to English first, the same question asked in another language hits too;
+# the caller translates the answer out as usual.
+#
+# Answers depend on the system message as well, so each system message has
+# an index of its own. Turns with conversation history are never cached:
+# a follow-up's answer depends on the turns before it.
+#
+# Entries are evicted least-recently-used beyond ANSWER_CACHE_SIZE.
+# ANSWER_CACHE_SIZE=0 disables the cache.
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import faiss
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_MIN_WORDS = 3  # "why?" or "tell me more" depend on the conversation, not the words
+
+
+class CachedAnswer:
+    __slots__ = ("system", "query", "answer", "sources", "created", "hits", "last_similarity")
+
+    def __init__(self, system, query, answer, sources):
+        self.system = system
+        self.query = query
+        self.answer = answer
+        self.sources = sources
+        self.created = time.time()
+        self.hits = 0
+        self.last_similarity = None
+
+
+def _normalized(vector):
+    vector = np.array(vector, dtype="float32").reshape(1, -1)  # a copy: normalized in place
+    faiss.normalize_L2(vector)
+    return vector
+
+
+class SemanticAnswerCache:
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._indexes = {}  # system message -> inner product over normalized vectors = cosine
+        self._entries = OrderedDict()  # id -> CachedAnswer, least recently used first
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._hit_similarity = 0.0
+
+    def cacheable(self, query, images=None, has_history=False):
+        return (self.max_entries > 0 and not images and not has_history
+                and len(query.split()) >= ANSWER_CACHE_MIN_WORDS)
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        index = self._indexes[entry.system]
+        index.remove_ids(np.array([entry_id], dtype="int64"))
+        if index.ntotal == 0:
+            del self._indexes[entry.system]
+
+    def get(self, vector, system=None):
+        """The cached answer for a query embedding under `system` (the system message), or None."""
+        with self._lock:
+            index = self._indexes.get(system)
+            if index is None:
+                self.misses += 1
+                return None
+            scores, ids = index.search(_normalized(vector), 1)
+            similarity, entry_id = float(scores[0][0]), int(ids[0][0])
+            entry = self._entries.get(entry_id)
+            if entry is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            if time.time() - entry.created > self.ttl:
+                self._remove(entry_id)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            entry.hits += 1
+            entry.last_similarity = round(similarity, 4)
+            self.hits += 1
+            self._hit_similarity += similarity
+            print(f"💾 Answer cache hit (similarity {similarity:.3f}): {entry.query!r}")
+            return entry
+
+    def put(self, vector, query, answer, sources=(), system=None):
+        if self.max_entries <= 0:
+            return
+        vector = _normalized(vector)
+        with self._lock:
+            index = self._indexes.get(system)
+            if index is None:
+                index = self._indexes[system] = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = CachedAnswer(system, query, answer, list(sources))
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for entry_id in list(self._entries):
+                self._remove(entry_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            top = sorted(self._entries.values(), key=lambda e: e.hits, reverse=True)[:5]
+            return {
+                "entries": len(self._entries),
+                "system_messages": len(self._indexes),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "avg_hit_similarity": round(self._hit_similarity / self.hits, 4) if self.hits else None,
+                "top_entries": [
+                    {"query": e.query, "hits": e.hits, "last_similarity": e.last_similarity,
+                     "age_seconds": round(time.time() - e.created)}
+                    for e in top if e.hits
+                ],
+            }
+
+
+answer_cache = SemanticAnswerCache()
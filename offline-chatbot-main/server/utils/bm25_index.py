@@ -0,0 +1,236 @@
+# server/utils/bm25_index.py
+#
+# BM25 lexical index over the chunk texts, searched next to FAISS so exact
+# identifiers (course codes like R20A0513), names and rare words are found
+# even when the dense embedding misses them. Results of both are merged with
+# reciprocal-rank fusion.
+#
+# Tokenization keeps Indic words whole: Python's \w does not match combining
+# marks (matras, viramas, anusvara...), so a plain \w+ tokenizer cuts "हिंदी"
+# into pieces. Text is NFC-normalized and casefolded, zero-width joiners are
+# dropped and native digits are mapped to ASCII ones.
+#
+# On-disk layout (little-endian), memory-mapped on load:
+#   bytes 0..63   header: magic b"BM25", version, n_docs, n_terms,
+#                 n_postings, vocabulary bytes, avgdl, k1, b
+#   int64   [n_docs]        chunk id of each document
+#   uint32  [n_docs]        document length in tokens
+#   float32 [n_terms]       idf
+#   uint64  [n_terms + 1]   start of each term's postings
+#   uint32  [n_postings]    document number of each posting
+#   uint16  [n_postings]    term frequency of each posting (saturated)
+#   utf-8   vocabulary, terms separated by "\n", in term-number order
+
+import os
+import re
+import json
+import struct
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+MAGIC = b"BM25"
+VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<4sIQQQQfff")
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+MAX_TF = 0xFFFF
+
+# Only distinctive query terms are searched for and counted in `matched`:
+# not a stopword, and in at most ~60% of chunks (idf >= BM25_MIN_IDF).
+# Queries reach the index in English, so the stopword list is English.
+BM25_MIN_IDF = float(os.getenv("BM25_MIN_IDF", "0.5"))
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers him his how i if in into is it its just me more most my no nor not now of off on once only or
+other our ours out over own please same she should so some such tell than that the their theirs them then
+there these they this those through to too under until up very was we were what when where which while
+who whom why will with would you your yours
+""".split())
+
+
+# -------------------- Tokenization --------------------
+def _indic_ranges():
+    """Combining marks and native digits of the Latin diacritic, Arabic, Indic and Meetei blocks."""
+    marks, digits = [], {}
+    for first, last in ((0x0300, 0x036F), (0x0600, 0x06FF), (0x0750, 0x077F), (0x0900, 0x0D7F), (0xABC0, 0xABFF)):
+        for cp in range(first, last + 1):
+            ch = chr(cp)
+            category = unicodedata.category(ch)
+            if category.startswith("M"):
+                marks.append(ch)
+            elif category == "Nd" and cp > 0x7F:
+                digits[cp] = str(unicodedata.digit(ch))
+    return "".join(marks), digits
+
+
+_MARKS, _DIGITS = _indic_ranges()
+_TRANSLATE = {**_DIGITS, 0x200C: None, 0x200D: None}  # ZWNJ / ZWJ
+TOKEN = re.compile(f"[\\w{re.escape(_MARKS)}]+")
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFC", text).casefold().translate(_TRANSLATE)
+    return TOKEN.findall(text)
+
+
+# -------------------- Building --------------------
+def write_bm25(path, records, k1=BM25_K1, b=BM25_B):
+    """
+    Build the index from `records`, an iterable of (chunk_id, text), and
+    write it to `path`. Returns the number of documents.
+    """
+    doc_ids, doc_lens = [], []
+    postings = {}  # term -> ([doc numbers], [tfs])
+    for chunk_id, text in records:
+        doc = len(doc_ids)
+        terms = Counter(tokenize(text))
+        doc_ids.append(chunk_id)
+        doc_lens.append(sum(terms.values()))
+        for term, tf in terms.items():
+            entry = postings.get(term)
+            if entry is None:
+                entry = postings[term] = ([], [])
+            entry[0].append(doc)
+            entry[1].append(min(tf, MAX_TF))
+
+    n_docs = len(doc_ids)
+    terms = sorted(postings)
+    df = np.array([len(postings[t][0]) for t in terms], dtype="<u8")
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype("<f4")
+    offsets = np.zeros(len(terms) + 1, dtype="<u8")
+    np.cumsum(df, out=offsets[1:])
+    vocab = "\n".join(terms).encode("utf-8")
+    avgdl = float(np.mean(doc_lens)) if doc_lens else 0.0
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        header = _HEADER.pack(MAGIC, VERSION, n_docs, len(terms), int(offsets[-1]), len(vocab), avgdl, k1, b)
+        f.write(header + b"\0" * (HEADER_SIZE - len(header)))
+        f.write(np.asarray(doc_ids, dtype="<i8").tobytes())
+        f.write(np.asarray(doc_lens, dtype="<u4").tobytes())
+        f.write(idf.tobytes())
+        f.write(offsets.tobytes())
+        for t in terms:
+            f.write(np.asarray(postings[t][0], dtype="<u4").tobytes())
+        for t in terms:
+            f.write(np.asarray(postings[t][1], dtype="<u2").tobytes())
+        f.write(vocab)
+    os.replace(tmp_path, path)
+    return n_docs
+
+
+def write_bm25_from_log(path, chunk_log_path, live):
+    """Build the index from the build's chunk log (live chunk ids only)."""
+    def records():
+        with open(chunk_log_path, "r", encoding="utf-8") as log:
+            for line in log:
+                record = json.loads(line)
+                if record["id"] in live:
+                    yield record["id"], record["text"]
+    return write_bm25(path, records())
+
+
+# -------------------- Searching --------------------
+class BM25Index:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            raw = f.read(HEADER_SIZE)
+        if len(raw) < HEADER_SIZE:
+            raise ValueError(f"❌ BM25 index is truncated: {path}")
+        magic, version, n_docs, n_terms, n_postings, vocab_bytes, avgdl, k1, b = _HEADER.unpack_from(raw)
+        if magic != MAGIC:
+            raise ValueError(f"❌ Not a BM25 index (bad magic): {path}")
+        if version != VERSION:
+            raise ValueError(f"❌ Unsupported BM25 index version {version}: {path}")
+
+        data = np.memmap(path, dtype="u1", mode="r")
+        pos = HEADER_SIZE
+
+        def section(dtype, count):
+            nonlocal pos
+            array = data[pos:pos + count * np.dtype(dtype).itemsize].view(dtype)
+            pos += array.nbytes
+            return array
+
+        self.doc_ids = section("<i8", n_docs)
+        doc_lens = section("<u4", n_docs)
+        self.idf = section("<f4", n_terms)
+        self.offsets = section("<u8", n_terms + 1)
+        self.docs = section("<u4", n_postings)
+        self.tfs = section("<u2", n_postings)
+        vocab = bytes(section("u1", vocab_bytes)).decode("utf-8")
+        self.terms = {term: i for i, term in enumerate(vocab.split("\n"))} if vocab else {}
+        self.k1 = k1
+        # Per-document part of the BM25 denominator, computed once
+        self._norm = (k1 * (1 - b + b * doc_lens / avgdl)).astype("float32") if avgdl else np.full(n_docs, k1, "float32")
+        self.n_docs = n_docs
+
+    def search(self, query, k=8):
+        """
+        Return (chunk_ids, scores, matched) for the top `k` documents that
+        contain a distinctive query term. `matched` is the idf-weighted
+        share of the query's distinctive terms the top document contains:
+        1.0 when every one of them occurs in it. Distinctive terms the
+        corpus has never seen count at the highest possible idf.
+        """
+        if not self.n_docs:
+            return [], [], 0.0
+        query_terms = {t for t in tokenize(query) if t not in STOPWORDS}
+        term_ids = sorted(
+            self.terms[t] for t in query_terms
+            if t in self.terms and self.idf[self.terms[t]] >= BM25_MIN_IDF
+        )
+        if not term_ids:
+            return [], [], 0.0
+        unknown_idf = sum(1 for t in query_terms if t not in self.terms) * float(np.log1p((self.n_docs + 0.5) / 0.5))
+
+        term_docs, weights = [], []
+        for t in term_ids:
+            start, end = int(self.offsets[t]), int(self.offsets[t + 1])
+            d = self.docs[start:end]
+            tf = self.tfs[start:end].astype("float32")
+            term_docs.append(d)
+            weights.append(self.idf[t] * tf * (self.k1 + 1) / (tf + self._norm[d]))
+        scores = np.bincount(np.concatenate(term_docs), weights=np.concatenate(weights), minlength=self.n_docs)
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return [], [], 0.0
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        # Postings are in document order, so membership is a binary search
+        best = top[0]
+        query_idf = sum(float(self.idf[t]) for t in term_ids) + unknown_idf
+        hit_idf = sum(
+            float(self.idf[t]) for t, d in zip(term_ids, term_docs)
+            if (i := np.searchsorted(d, best)) < len(d) and d[i] == best
+        )
+        matched = hit_idf / query_idf if query_idf > 0 else 0.0
+        return self.doc_ids[top].tolist(), scores[top].tolist(), matched
+
+
+def load_bm25(path):
+    """The BM25 index at `path`, or None if there is none (or it is unreadable)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return BM25Index(path)
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Ignoring BM25 index: {e}")
+        return None
+
+
+def reciprocal_rank_fusion(rankings, limit, k=RRF_K):
+    """Merge ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:limit]
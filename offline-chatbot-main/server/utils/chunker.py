@@ -0,0 +1,134 @@
+# server/utils/chunker.py
+#
+# Token-aware sliding-window chunker for the Python ingestion path.
+# Chunk size is measured with the embedder's own tokenizer, so chunks are
+# never silently truncated at embedding time. Boundaries follow paragraphs
+# and sentences (Latin, danda and Urdu terminators); consecutive chunks share
+# a configurable token overlap. Every chunk carries its source and character
+# offsets into the original document.
+
+import os
+import re
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "0"))      # 0 = embedder's max_seq_length
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Sentence ends: . ! ? (Latin), । ॥ (Devanagari, Bengali, ...), ۔ ؟ (Urdu), or a line break
+SENTENCE_BREAK = re.compile(r"(?<=[.!?।॥۔؟])\s+|\n")
+
+
+def _units(text):
+    """Yield (start, end, starts_paragraph) spans for each sentence of `text`."""
+    para_start = 0
+    for para in PARAGRAPH_BREAK.split(text):
+        para_offset = text.index(para, para_start) if para else para_start
+        para_start = para_offset + len(para)
+        first = True
+        pos = 0
+        for match in list(SENTENCE_BREAK.finditer(para)) + [None]:
+            end = match.start() if match else len(para)
+            segment = para[pos:end]
+            if segment.strip():
+                lead = len(segment) - len(segment.lstrip())
+                trail = len(segment.rstrip())
+                yield para_offset + pos + lead, para_offset + pos + trail, first
+                first = False
+            if match:
+                pos = match.end()
+
+
+def _token_counts(tokenizer, pieces):
+    if not pieces:
+        return []
+    encoded = tokenizer(pieces, add_special_tokens=False)["input_ids"]
+    return [len(ids) for ids in encoded]
+
+
+def _split_oversized(text, start, end, tokenizer, max_tokens):
+    """Cut a single over-long sentence into windows of at most `max_tokens` tokens."""
+    piece = text[start:end]
+    try:
+        offsets = tokenizer(piece, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    except (NotImplementedError, KeyError, TypeError):
+        offsets = None  # slow tokenizer: fall back to words
+    spans = []
+    if offsets:
+        for i in range(0, len(offsets), max_tokens):
+            window = offsets[i:i + max_tokens]
+            spans.append((start + window[0][0], start + window[-1][1], len(window)))
+    else:
+        words = [(m.start(), m.end()) for m in re.finditer(r"\S+", piece)]
+        for i in range(0, len(words), max_tokens // 2 or 1):
+            window = words[i:i + (max_tokens // 2 or 1)]
+            spans.append((start + window[0][0], start + window[-1][1], None))
+    return spans
+
+
+def chunk_text(text, tokenizer, source=None, max_tokens=None, overlap=CHUNK_OVERLAP):
+    """
+    Split `text` into chunks of at most `max_tokens` embedder tokens.
+
+    Returns a list of {"text", "source", "start", "end", "chunk_index", "tokens"}
+    dicts; `start`/`end` are character offsets into `text`.
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS or getattr(tokenizer, "model_max_length", 256)
+    max_tokens = max(8, min(max_tokens, 8192) - 2)  # room for [CLS]/[SEP]
+    overlap = max(0, min(overlap, max_tokens // 2))
+
+    spans = list(_units(text))
+    counts = _token_counts(tokenizer, [text[s:e] for s, e, _ in spans])
+
+    # (start, end, tokens, starts_paragraph), with oversized sentences pre-split
+    units = []
+    for (start, end, new_para), count in zip(spans, counts):
+        if count <= max_tokens:
+            units.append((start, end, count, new_para))
+            continue
+        for i, (s, e, n) in enumerate(_split_oversized(text, start, end, tokenizer, max_tokens)):
+            if n is None:
+                n = _token_counts(tokenizer, [text[s:e]])[0]
+            units.append((s, e, n, new_para and i == 0))
+
+    chunks = []
+    current, current_tokens = [], 0
+
+    def flush():
+        chunk_start, chunk_end = current[0][0], current[-1][1]
+        chunks.append({
+            "text": text[chunk_start:chunk_end],
+            "source": source,
+            "start": chunk_start,
+            "end": chunk_end,
+            "chunk_index": len(chunks),
+            "tokens": current_tokens,
+        })
+
+    for unit in units:
+        _, _, count, new_para = unit
+        # Prefer paragraph boundaries once the chunk is reasonably full
+        para_break = new_para and current_tokens >= max_tokens // 2
+        if current and (current_tokens + count > max_tokens or para_break):
+            flush()
+            # Carry trailing sentences forward as overlap
+            carried, carried_tokens = [], 0
+            for prev in reversed(current):
+                if carried_tokens + prev[2] > overlap or carried_tokens + prev[2] + count > max_tokens:
+                    break
+                carried.insert(0, prev)
+                carried_tokens += prev[2]
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += count
+
+    if current:
+        flush()
+    return chunks
+
+
+def chunk_documents(documents, tokenizer, max_tokens=None, overlap=CHUNK_OVERLAP):
+    """Chunk a list of {"text", "source"} page dicts, as yielded by extraction.extract_files."""
+    chunks = []
+    for doc in documents:
+        chunks.extend(chunk_text(doc["text"], tokenizer, doc.get("source"), max_tokens, overlap))
+    return chunks
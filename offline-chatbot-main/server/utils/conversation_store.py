@@ -0,0 +1,135 @@
+# server/utils/conversation_store.py
+#
+# Server-side conversation history, so a /chat request only has to carry the
+# new turn and its conversation_id. Turns are stored by the chat-log writer
+# in Mongo's `chats` collection (indexed on conversation_id, timestamp); the
+# HISTORY_TURNS most recent ones of active conversations are kept in an LRU
+# here together with their token counts, so neither Mongo nor the tokenizer
+# is touched again for history on later turns.
+#
+# Turns logged while a conversation is not cached may still be queued in the
+# writer; they are kept as pending and merged (by _id) when it is loaded.
+
+import os
+import threading
+from collections import OrderedDict
+
+from server.mongo_db import get_collection, store_chat
+
+HISTORY_TURNS = int(os.getenv("HISTORY_TURNS", "20"))  # user/assistant pairs kept per conversation
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "1024"))  # conversations kept in memory
+
+
+def _messages(record):
+    """Prompt history entries for one stored turn, oldest first."""
+    return [f"user: {record.get('user', '')}\n", f"assistant: {record.get('assistant', '')}\n"]
+
+
+class _Conversation:
+    def __init__(self):
+        self.turns = []      # [(_id, [[text, tokens], ...])], oldest first
+        self.loaded = False  # False: turns holds only what was logged since
+
+    def add(self, record):
+        self.turns.append((record["_id"], [[text, None] for text in _messages(record)]))
+        del self.turns[:-HISTORY_TURNS]
+
+
+class ConversationStore:
+    def __init__(self, max_conversations=HISTORY_CACHE_SIZE):
+        self.max_conversations = max_conversations
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.load_failures = 0
+
+    def _entry(self, conversation_id):
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            entry = self._conversations[conversation_id] = _Conversation()
+        self._conversations.move_to_end(conversation_id)
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+        return entry
+
+    def _load(self, conversation_id):
+        """The most recent stored turns, oldest first; None if the query failed."""
+        collection = get_collection()
+        if collection is None:
+            return []
+        try:
+            # Served by the (conversation_id, timestamp) index
+            cursor = (collection.find({"conversation_id": conversation_id}, {"user": 1, "assistant": 1})
+                      .sort("timestamp", -1).limit(HISTORY_TURNS))
+            return list(cursor)[::-1]
+        except Exception as e:
+            print(f"⚠️ Could not load history for {conversation_id}: {e}")
+            self.load_failures += 1
+            return None
+
+    def log_turn(self, conversation_id, user_msg, bot_msg, lang_iso, retrieval=None):
+        """Store a finished turn (via the chat-log writer) and add it to the history."""
+        record = store_chat(conversation_id, user_msg, bot_msg, lang_iso, retrieval)
+        with self._lock:
+            self._entry(conversation_id).add(record)
+
+    def _loaded(self, conversation_id):
+        """The entry for `conversation_id`, with its stored turns loaded once."""
+        with self._lock:
+            entry = self._conversations.get(conversation_id)
+            loaded = entry is not None and entry.loaded
+            if loaded:
+                self._conversations.move_to_end(conversation_id)
+                self.hits += 1
+
+        if not loaded:
+            records = self._load(conversation_id)  # outside the lock: a Mongo round trip
+            with self._lock:
+                entry = self._entry(conversation_id)
+                if not entry.loaded and records is not None:
+                    pending = entry.turns
+                    entry.turns = []
+                    for record in records:
+                        entry.add(record)
+                    stored = {record["_id"] for record in records}
+                    entry.turns += [turn for turn in pending if turn[0] not in stored]
+                    del entry.turns[:-HISTORY_TURNS]
+                    entry.loaded = True
+                    self.loads += 1
+        return entry
+
+    def has_history(self, conversation_id):
+        """Whether `conversation_id` has earlier turns."""
+        entry = self._loaded(conversation_id)
+        with self._lock:
+            return bool(entry.turns)
+
+    def history(self, conversation_id, counter):
+        """
+        Prompt history entries for `conversation_id`, newest first, as
+        (entries, token_counts). Counts come from `counter` and are computed
+        once per message.
+        """
+        entry = self._loaded(conversation_id)
+        with self._lock:
+            messages = [message for _, turn in entry.turns for message in turn]
+        for message in messages:
+            if message[1] is None:
+                message[1] = counter.count(message[0])
+        texts = [text for text, _ in reversed(messages)]
+        counts = [tokens for _, tokens in reversed(messages)]
+        return texts, counts
+
+    def stats(self):
+        with self._lock:
+            return {
+                "conversations": len(self._conversations),
+                "max_conversations": self.max_conversations,
+                "hits": self.hits,
+                "loads": self.loads,
+                "load_failures": self.load_failures,
+            }
+
+
+conversation_store = ConversationStore()
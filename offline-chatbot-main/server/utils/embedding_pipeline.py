@@ -0,0 +1,260 @@
+# server/utils/embedding_pipeline.py
+#
+# Streaming index build. Chunks are embedded in fixed-size batches and every
+# batch goes straight into the FAISS index, the raw vector file and an
+# append-only chunk log (one JSON record per line), so peak memory follows the
+# batch size rather than the corpus size.
+#
+# Every CHECKPOINT_EVERY chunks the index and manifest are saved next to the
+# live files with a ".partial" suffix. The server keeps reading the last
+# complete build meanwhile; an interrupted build resumes from the checkpoint.
+# A fresh (--full) build also writes its chunk log and vectors to ".partial"
+# paths, since its ids start again at 0; they replace the live ones only when
+# the build finishes. text_map.json, chunks.json and the BM25 index are
+# written at the end by streaming over the chunk log.
+
+import os
+import json
+import time
+import numpy as np
+import faiss
+from vector_io import VectorAppender, read_header, write_faiss_index
+from index_factory import create_index, needs_training, set_search_params, INDEX_SPEC, TRAIN_SAMPLE
+from incremental_index import save_manifest, remove_files, reserve_ids, live_ids
+from bm25_index import write_bm25_from_log
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", "5000"))  # chunks between checkpoints
+PARTIAL = ".partial"
+
+
+class StreamingIndexBuilder:
+    """
+    Embed chunks file by file into an ID-mapped index.
+
+    Pass index=None (and an empty manifest) for a fresh build; otherwise
+    `index` and `manifest` are the ones being updated, either the last
+    complete build or a checkpoint being resumed.
+    """
+
+    def __init__(self, model, manifest, index=None, *, index_path, vector_path, chunk_log_path,
+                 text_map_path, chunks_json_path, manifest_path, trained_path=None, bm25_path=None,
+                 retrain=False, spec=INDEX_SPEC, batch_size=EMBED_BATCH_SIZE, checkpoint_every=CHECKPOINT_EVERY):
+        self.model = model
+        self.dim = model.get_sentence_embedding_dimension()
+        self.manifest = manifest
+        self.index = index
+        self.index_path = index_path
+        self.vector_path = vector_path
+        self.chunk_log_path = chunk_log_path
+        self.text_map_path = text_map_path
+        self.chunks_json_path = chunks_json_path
+        self.manifest_path = manifest_path
+        self.trained_path = trained_path
+        self.retrain = retrain
+        self.bm25_path = bm25_path
+        self.spec = spec
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+
+        self._queue = []           # (id, text) waiting to be embedded
+        self._train_buffer = []    # (ids, vectors) held back until the index can be trained
+        self._buffered = 0
+        self._train_rows = TRAIN_SAMPLE if index is None and needs_training(spec, self.dim) else 0
+        self._since_checkpoint = 0
+        self.embedded = 0
+        self._started = time.perf_counter()
+
+        # A fresh build, or a checkpoint of one being resumed, works on its own
+        # chunk log and vector file until finish()
+        if index is None:
+            manifest["fresh"] = True
+        self.fresh = manifest.get("fresh", False)
+        self._log_path = chunk_log_path + PARTIAL if self.fresh else chunk_log_path
+        self._vector_path = vector_path + PARTIAL if self.fresh else vector_path
+
+        if index is None:
+            stale = (index_path + PARTIAL, manifest_path + PARTIAL, self._log_path, self._vector_path)
+        elif not self.fresh:
+            stale = (chunk_log_path + PARTIAL, vector_path + PARTIAL)  # an abandoned fresh build
+        else:
+            stale = ()
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+
+        if index is None:
+            self._log = open(self._log_path, "w", encoding="utf-8")
+            self._vectors = VectorAppender(self._vector_path, self.dim)
+        else:
+            self._compact_chunk_log()
+            self._log = open(self._log_path, "a", encoding="utf-8")
+            self._vectors = self._resume_vectors()
+
+    # -------------------- setup --------------------
+    def _compact_chunk_log(self):
+        """Keep only records of chunks the manifest still lists (drops removed files and
+        anything written after the checkpoint being resumed)."""
+        live = live_ids(self.manifest)
+        tmp_path = self._log_path + ".tmp"
+        with open(self._log_path, "r", encoding="utf-8") as src, \
+                open(tmp_path, "w", encoding="utf-8") as dst:
+            for line in src:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line of an interrupted build
+                if record.get("id") in live:
+                    dst.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self._log_path)
+
+    def _resume_vectors(self):
+        # Row i of the vector file is chunk id i, which only holds if every
+        # earlier build appended to it
+        rows = self.manifest.get("vector_rows")
+        if rows is not None and rows == self.manifest["next_id"] and os.path.exists(self._vector_path):
+            try:
+                if read_header(self._vector_path)[0] >= rows:
+                    return VectorAppender(self._vector_path, self.dim, rows=rows)
+            except ValueError as e:
+                print(f"⚠️ {e}")
+        if os.path.exists(self._vector_path):
+            print("⚠️ Raw vector file is out of sync with the index; dropping it until the next --full build")
+            os.remove(self._vector_path)
+        return None
+
+    # -------------------- building --------------------
+    def remove(self, rel_paths):
+        """Drop the chunks of changed / deleted files. Returns the number removed."""
+        return remove_files(self.index, self.manifest, rel_paths)
+
+    def add_file(self, rel_path, fingerprint, chunks):
+        """Queue the chunks of one file; full batches are embedded right away."""
+        ids = reserve_ids(self.manifest, rel_path, fingerprint, len(chunks))
+        for chunk_id, chunk in zip(ids, chunks):
+            self._log.write(json.dumps(dict(chunk, id=chunk_id), ensure_ascii=False) + "\n")
+            self._queue.append((chunk_id, chunk["text"]))
+        while len(self._queue) >= self.batch_size:
+            batch, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+            self._embed(batch)
+
+        self._since_checkpoint += len(chunks)
+        # Checkpoints fall on file boundaries, so the manifest only lists whole files
+        if self._since_checkpoint >= self.checkpoint_every and self.index is not None:
+            self.checkpoint()
+
+    def _embed(self, batch):
+        if not batch:
+            return
+        ids = np.array([chunk_id for chunk_id, _ in batch], dtype="int64")
+        vectors = self.model.encode([text for _, text in batch], batch_size=self.batch_size,
+                                    convert_to_numpy=True, show_progress_bar=False)
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if self._vectors is not None:
+            self._vectors.append(vectors)
+        if self.index is None:
+            self._train_buffer.append((ids, vectors))
+            self._buffered += len(ids)
+            if self._buffered >= self._train_rows:
+                self._create_index()
+        else:
+            self.index.add_with_ids(vectors, ids)
+        self.embedded += len(batch)
+
+    def _create_index(self):
+        sample = np.vstack([vectors for _, vectors in self._train_buffer])
+        self.index = faiss.IndexIDMap2(create_index(sample, self.spec, trained_path=self.trained_path,
+                                                      retrain=self.retrain))
+        for ids, vectors in self._train_buffer:
+            self.index.add_with_ids(vectors, ids)
+        self._train_buffer, self._buffered = [], 0
+
+    def _flush_queue(self):
+        self._embed(self._queue)
+        self._queue = []
+        if self.index is None and self._train_buffer:
+            self._create_index()
+
+    def _sync(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self.manifest["vector_rows"] = self._vectors.rows if self._vectors is not None else None
+
+    def checkpoint(self):
+        """Persist everything embedded so far so an interrupted build can resume."""
+        self._flush_queue()
+        self._sync()
+        write_faiss_index(self.index, self.index_path + PARTIAL)
+        save_manifest(self.manifest, self.manifest_path + PARTIAL)
+        self._since_checkpoint = 0
+        self.report("💾 Checkpoint:")
+
+    def report(self, prefix="⚙️"):
+        elapsed = time.perf_counter() - self._started
+        rate = self.embedded / elapsed if elapsed > 0 else 0.0
+        print(f"{prefix} {self.embedded} chunks embedded in {elapsed:.1f}s ({rate:.1f} chunks/s)")
+
+    def finish(self):
+        """
+        Embed what is left and write the final index, vectors, text map,
+        chunks.json, BM25 index and manifest. Returns the index, or None if nothing was
+        ever embedded.
+        """
+        self._flush_queue()
+        self._sync()
+        if self._vectors is not None:
+            self._vectors.close()
+        self._log.close()
+        if self.index is None:
+            return None
+        set_search_params(self.index)
+
+        # Every output is renamed into place. Text map and BM25 go first and
+        # the index last: the server only reloads once the index file changes.
+        self._write_text_outputs()
+        if self.bm25_path:
+            documents = write_bm25_from_log(self.bm25_path, self._log_path, live_ids(self.manifest))
+            print(f"🔤 BM25 index over {documents} chunks written to {self.bm25_path}")
+        write_faiss_index(self.index, self.index_path)
+
+        # Then the build's own state, manifest last
+        if self.fresh:
+            if self._vectors is not None:
+                os.replace(self._vector_path, self.vector_path)
+            elif os.path.exists(self.vector_path):
+                os.remove(self.vector_path)
+            os.replace(self._log_path, self.chunk_log_path)
+            self._log_path, self._vector_path = self.chunk_log_path, self.vector_path
+            del self.manifest["fresh"]
+        save_manifest(self.manifest, self.manifest_path)
+        for path in (self.index_path + PARTIAL, self.manifest_path + PARTIAL):
+            if os.path.exists(path):
+                os.remove(path)
+        self.report()
+        return self.index
+
+    def _write_text_outputs(self):
+        """Stream the live chunk records into text_map.json and chunks.json."""
+        live = live_ids(self.manifest)
+        text_map_tmp = self.text_map_path + ".tmp"
+        chunks_tmp = self.chunks_json_path + ".tmp"
+        with open(self._log_path, "r", encoding="utf-8") as log, \
+                open(text_map_tmp, "w", encoding="utf-8") as text_map, \
+                open(chunks_tmp, "w", encoding="utf-8") as chunks:
+            text_map.write("{")
+            chunks.write("[")
+            sep = "\n"
+            for line in log:
+                record = json.loads(line)
+                if record["id"] not in live:
+                    continue
+                text_map.write(f'{sep}  {json.dumps(str(record["id"]))}: '
+                               f'{json.dumps(record["text"], ensure_ascii=False)}')
+                chunks.write(f"{sep}  {json.dumps(record, ensure_ascii=False)}")
+                sep = ",\n"
+            text_map.write("\n}\n")
+            chunks.write("\n]\n")
+        os.replace(text_map_tmp, self.text_map_path)
+        os.replace(chunks_tmp, self.chunks_json_path)
@@ -0,0 +1,117 @@
+# server/utils/extraction.py
+#
+# Document text extraction for the ingestion scripts. Files are extracted in
+# a process pool, one task per file, with a per-file timeout. A file that
+# fails or hangs is reported and skipped without affecting the others, and
+# results are yielded as soon as each file finishes so chunking / embedding
+# can start before the whole upload folder has been read.
+
+import os
+import json
+import time
+import threading
+import multiprocessing
+from collections import deque
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0")) or max(1, (os.cpu_count() or 2) - 1)
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "120"))
+SUPPORTED_EXTENSIONS = (".json", ".txt", ".docx", ".pdf")
+
+
+def extract_file(file_path):
+    """Extract the text of a single upload as a list of {"text", "source"} documents."""
+    file = os.path.basename(file_path)
+    if file.endswith(".json"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = json.load(f)
+        return [{"text": json.dumps(content, ensure_ascii=False), "source": file_path}]
+    if file.endswith(".txt"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            return [{"text": f.read(), "source": file_path}]
+    if file.endswith(".docx"):
+        from docx import Document
+        doc = Document(file_path)
+        return [{"text": "\n".join(para.text for para in doc.paragraphs), "source": file_path}]
+    if file.endswith(".pdf"):
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as pdf:
+            return [{"text": "".join(page.get_text() for page in pdf), "source": file_path}]
+    return []
+
+
+def _extract_safely(file_path):
+    # Runs in a worker: return errors as text, since arbitrary exceptions
+    # (e.g. from PyMuPDF) are not always picklable.
+    try:
+        return extract_file(file_path), None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+
+def extract_files(paths, workers=EXTRACT_WORKERS, timeout=EXTRACT_TIMEOUT):
+    """
+    Extract `paths` in parallel, yielding (path, documents, error) in
+    completion order. `error` is None on success. A file running longer
+    than `timeout` seconds is reported as failed; its worker is killed and
+    the pool restarted.
+    """
+    paths = deque(paths)
+    if not paths:
+        return
+    if workers <= 1:
+        for path in paths:
+            docs, error = _extract_safely(path)
+            yield path, docs, error
+        return
+
+    ctx = multiprocessing.get_context()
+    wake = threading.Event()
+    pool = ctx.Pool(workers)
+    in_flight = {}  # path -> (AsyncResult, start time)
+    try:
+        while paths or in_flight:
+            # Keep at most `workers` tasks in flight so start times are accurate
+            while paths and len(in_flight) < workers:
+                path = paths.popleft()
+                result = pool.apply_async(_extract_safely, (path,),
+                                          callback=lambda _: wake.set(),
+                                          error_callback=lambda _: wake.set())
+                in_flight[path] = (result, time.monotonic())
+
+            wake.wait(0.5)
+            wake.clear()
+
+            for path in [p for p, (r, _) in in_flight.items() if r.ready()]:
+                result, _ = in_flight.pop(path)
+                try:
+                    docs, error = result.get()
+                except Exception as e:
+                    docs, error = [], f"{type(e).__name__}: {e}"
+                yield path, docs, error
+
+            now = time.monotonic()
+            expired = [p for p, (_, started) in in_flight.items() if now - started > timeout]
+            if expired:
+                for path in expired:
+                    in_flight.pop(path)
+                    yield path, [], f"timed out after {timeout:g}s"
+                # A hung worker can't be cancelled: restart the pool and
+                # resubmit the files that were still running alongside it.
+                pool.terminate()
+                pool.join()
+                paths.extendleft(reversed(list(in_flight)))
+                in_flight.clear()
+                pool = ctx.Pool(workers)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def list_uploads(folder_path):
+    """All supported files under `folder_path`."""
+    return [
+        os.path.join(root, file)
+        for root, _, files in os.walk(folder_path)
+        for file in files
+        if file.endswith(SUPPORTED_EXTENSIONS)
+    ]
@@ -1,51 +1,11 @@
 import os
-import json
-import numpy as np
-import faiss
+import sys
 from sentence_transformers import SentenceTransformer
-from docx import Document
-import fitz  # PyMuPDF
-
-def read_files_from_folder(folder_path):
-    chunks = []
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            try:
-                if file.endswith(".json"):
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = json.load(f)
-                        chunks.append({
-                            "text": json.dumps(content, ensure_ascii=False),
-                            "source": file_path
-                        })
-                elif file.endswith(".txt"):
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        chunks.append({
-                            "text": content,
-                            "source": file_path
-                        })
-                elif file.endswith(".docx"):
-                    doc = Document(file_path)
-                    full_text = "\n".join([para.text for para in doc.paragraphs])
-                    chunks.append({
-                        "text": full_text,
-                        "source": file_path
-                    })
-                elif file.endswith(".pdf"):
-                    pdf = fitz.open(file_path)
-                    full_text = ""
-                    for page in pdf:
-                        full_text += page.get_text()
-                    pdf.close()
-                    chunks.append({
-                        "text": full_text,
-                        "source": file_path
-                    })
-            except Exception as e:
-                print(f"❌ Error reading file {file_path}: {str(e)}")
-    return chunks
+from extraction import extract_files
+from chunker import chunk_text
+from incremental_index import MANIFEST_NAME, load_manifest, save_manifest, plan_changes, load_index, live_ids
+from embedding_pipeline import StreamingIndexBuilder, PARTIAL
+from bm25_index import write_bm25_from_log
 
 def main():
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -53,53 +13,113 @@ def main():
     CHUNKS_FOLDER = os.path.abspath(os.path.join(BASE_DIR, "..", "chunks"))
     VECTORSTORE_FOLDER = os.path.abspath(os.path.join(BASE_DIR, "..", "vectorstore"))
 
-    print(f"📁 Reading files from uploads folder: {UPLOAD_FOLDER}")
-    chunks = read_files_from_folder(UPLOAD_FOLDER)
-
-    if len(chunks) == 0:
-        print("❌ No files found or no text extracted from uploads folder.")
-        exit(1)
-
-    print(f"📦 Extracted {len(chunks)} text chunks from uploads.")
+    vector_index_path = os.path.join(VECTORSTORE_FOLDER, "vector_index.faiss")
+    vector_file_path = os.path.join(VECTORSTORE_FOLDER, "vector_index.vec")
+    text_map_path = os.path.join(VECTORSTORE_FOLDER, "text_map.json")
+    bm25_path = os.path.join(VECTORSTORE_FOLDER, "bm25.idx")
+    manifest_path = os.path.join(VECTORSTORE_FOLDER, MANIFEST_NAME)
+    chunks_json_path = os.path.join(CHUNKS_FOLDER, "chunks.json")
+    chunk_log_path = os.path.join(CHUNKS_FOLDER, "chunks.jsonl")
 
     os.makedirs(CHUNKS_FOLDER, exist_ok=True)
     os.makedirs(VECTORSTORE_FOLDER, exist_ok=True)
 
-    chunks_json_path = os.path.join(CHUNKS_FOLDER, "chunks.json")
-    with open(chunks_json_path, "w", encoding="utf-8") as f:
-        json.dump(chunks, f, ensure_ascii=False, indent=2)
-    print(f"📝 Saved extracted chunks to {chunks_json_path}")
-
-    texts = [chunk["text"] for chunk in chunks]
+    # `--full` ignores the manifest and any checkpoint and rebuilds everything
+    full_rebuild = "--full" in sys.argv
+    resumed = not full_rebuild and os.path.exists(manifest_path + PARTIAL)
+    if resumed:
+        print("⏯️ Resuming interrupted build from its last checkpoint")
+        manifest = load_manifest(manifest_path + PARTIAL)
+    elif not full_rebuild and os.path.exists(manifest_path):
+        manifest = load_manifest(manifest_path)
+    else:
+        full_rebuild = True
+        manifest = {"files": {}, "next_id": 0}
+
+    print(f"📁 Scanning uploads folder: {UPLOAD_FOLDER}")
+    changed, removed = plan_changes(UPLOAD_FOLDER, manifest)
+    if not full_rebuild and not resumed and not changed and not removed:
+        save_manifest(manifest, manifest_path)
+        if not os.path.exists(bm25_path) and os.path.exists(chunk_log_path):
+            documents = write_bm25_from_log(bm25_path, chunk_log_path, live_ids(manifest))
+            print(f"🔤 Built missing BM25 index over {documents} chunks.")
+        print("✅ Vector store is up to date; nothing to re-index.")
+        return
 
     print("🧠 Loading embedding model...")
     model = SentenceTransformer('sentence-transformers/distiluse-base-multilingual-cased-v1')
-
-    print(f"⚙️ Encoding {len(texts)} text chunks into vectors...")
-    vectors = model.encode(texts)
-    print(f"✅ Vectors shape: {vectors.shape}")
-
-    index = faiss.IndexFlatL2(vectors.shape[1])
-    index.add(np.array(vectors).astype("float32"))
-    print(f"📊 Added {index.ntotal} vectors to the FAISS index.")
-
-    vector_index_path = os.path.join(VECTORSTORE_FOLDER, "vector_index.faiss")
-    print(f"💾 Saving FAISS index to {vector_index_path} ...")
-    faiss.write_index(index, vector_index_path)
+    dim = model.get_sentence_embedding_dimension()
+
+    index = None
+    if not full_rebuild:
+        index = load_index(vector_index_path + PARTIAL if resumed else vector_index_path, dim)
+        # A checkpoint of a fresh build has its chunk log next to the live one
+        log_path = chunk_log_path + PARTIAL if manifest.get("fresh") else chunk_log_path
+        if index is not None and not os.path.exists(log_path):
+            print("⚠️ No chunk log from a previous build; rebuilding from scratch")
+            index = None
+        if index is None:
+            full_rebuild = True
+            manifest = {"files": {}, "next_id": 0}
+            changed, removed = plan_changes(UPLOAD_FOLDER, manifest)
+
+    builder = StreamingIndexBuilder(
+        model, manifest, index,
+        index_path=vector_index_path,
+        vector_path=vector_file_path,
+        chunk_log_path=chunk_log_path,
+        text_map_path=text_map_path,
+        chunks_json_path=chunks_json_path,
+        manifest_path=manifest_path,
+        trained_path=os.path.join(VECTORSTORE_FOLDER, "trained.faiss"),
+        bm25_path=bm25_path,
+        retrain="--full" in sys.argv,  # never reuse a quantizer trained on an older corpus
+    )
+
+    if removed and not full_rebuild:
+        try:
+            dropped = builder.remove(removed)
+            print(f"🗑️ Removed {dropped} chunks from {len(removed)} changed/deleted files.")
+        except RuntimeError as e:
+            # e.g. HNSW does not support removal
+            print(f"⚠️ Index type cannot remove vectors ({e}); run with --full to rebuild")
+            exit(1)
+
+    # Extract only new / changed files, split them into token-sized chunks and
+    # embed them in batches as each file finishes extracting
+    print(f"⚙️ Embedding {len(changed)} new/changed files in batches of {builder.batch_size} ...")
+    paths = {os.path.join(UPLOAD_FOLDER, rel_path): rel_path for rel_path in changed}
+    files_done = 0
+    for file_path, docs, error in extract_files(list(paths)):
+        if error:
+            print(f"❌ Error reading file {file_path}: {error}")
+            continue
+        rel_path = paths[file_path]
+        chunks = [
+            chunk
+            for doc in docs
+            for chunk in chunk_text(doc["text"], model.tokenizer, doc["source"], max_tokens=model.max_seq_length)
+        ]
+        builder.add_file(rel_path, changed[rel_path], chunks)
+        files_done += 1
+
+    index = builder.finish()
+    print(f"📦 Embedded {builder.embedded} text chunks from {files_done} new/changed files.")
+    if index is None:
+        print("❌ No files found or no text extracted from uploads folder.")
+        exit(1)
+    print(f"📊 FAISS index now holds {index.ntotal} vectors.")
 
     filesize = os.path.getsize(vector_index_path)
-    print(f"📦 Index file size after saving: {filesize} bytes")
-
+    print(f"💾 Saved FAISS index to {vector_index_path} ({filesize} bytes)")
     if filesize == 0:
         print("❌ Error: Saved FAISS index file is empty!")
         exit(1)
 
-    # ✅ FIXED: Save text_map as a dictionary instead of list
-    text_map = {str(i): text for i, text in enumerate(texts)}
-    text_map_path = os.path.join(VECTORSTORE_FOLDER, "text_map.json")
-    with open(text_map_path, "w", encoding="utf-8") as f:
-        json.dump(text_map, f, ensure_ascii=False, indent=2)
-    print(f"✅ Saved text map to {text_map_path} (dict format)")
+    if os.path.exists(vector_file_path):
+        print(f"💾 Raw vectors in {vector_file_path}")
+    print(f"✅ Saved text map to {text_map_path} and chunks to {chunks_json_path}")
+    print(f"🧾 Manifest updated: {len(manifest['files'])} files tracked")
 
     print("🎉 Vector store creation completed successfully!")
 
@@ -1,18 +1,95 @@
 # server/utils/html_scraper.py
+import time
 import requests
-from bs4 import BeautifulSoup
 
-def extract_text_from_url(url, timeout=10):
-    try:
-        response = requests.get(url, timeout=timeout)
-        soup = BeautifulSoup(response.text, "html.parser")
+try:
+    import lxml.html
+    HAS_LXML = True
+except ImportError:  # fall back to BeautifulSoup's pure-Python parser
+    from bs4 import BeautifulSoup
+    HAS_LXML = False
+
+MAX_BYTES = 1_500_000      # stop downloading after this many bytes
+MAX_LINES = 50             # lines of text returned per page
+MIN_LINE_CHARS = 40        # shorter lines are mostly menus / labels
+ALLOWED_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "header", "footer",
+                    "aside", "form", "svg", "iframe", "template"]
+
+
+def _chunks(response, chunk_size=16384):
+    """Body chunks as they arrive. iter_content() waits for a full chunk, so a slow
+    page would not get back to the deadline check; urllib3 2's read1() does not."""
+    raw = response.raw
+    if not hasattr(raw, "read1"):
+        yield from response.iter_content(chunk_size=chunk_size)
+        return
+    while True:
+        chunk = raw.read1(chunk_size, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _read_capped(response, max_bytes=MAX_BYTES, deadline=None):
+    """
+    Read at most `max_bytes` of the body, stopping early at `deadline`
+    (time.monotonic()), then drop the connection. requests' timeout only
+    bounds each socket read, so a page that drips bytes would run on.
+    """
+    chunks, size = [], 0
+    for chunk in _chunks(response):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes or (deadline is not None and time.monotonic() >= deadline):
+            break
+    return b"".join(chunks)[:max_bytes]
+
 
-        # Kill scripts/styles
-        for script in soup(["script", "style", "noscript"]):
-            script.decompose()
+def _long_lines(texts):
+    lines = []
+    for text in texts:
+        for line in text.splitlines():
+            line = line.strip()
+            if len(line) > MIN_LINE_CHARS:
+                lines.append(line)
+                if len(lines) >= MAX_LINES:
+                    return lines
+    return lines
+
+
+def _extract_lxml(raw, encoding):
+    parser = lxml.html.HTMLParser(encoding=encoding, remove_comments=True)
+    tree = lxml.html.document_fromstring(raw, parser=parser)
+    for element in list(tree.iter(*BOILERPLATE_TAGS)):
+        element.drop_tree()
+    return _long_lines(tree.itertext())
+
+
+def _extract_bs4(raw, encoding):
+    soup = BeautifulSoup(raw, "html.parser", from_encoding=encoding)
+    for element in soup(BOILERPLATE_TAGS):
+        element.decompose()
+    return _long_lines(soup.get_text(separator="\n").splitlines())
+
+
+def extract_text_from_url(url, timeout=10, session=None, deadline=None):
+    try:
+        if deadline is not None:
+            timeout = min(timeout, max(0.1, deadline - time.monotonic()))
+        with (session or requests).get(url, timeout=timeout, stream=True) as response:
+            content_type = response.headers.get("Content-Type", "text/html").split(";")[0].strip().lower()
+            if content_type not in ALLOWED_TYPES:
+                return f"[Skipped {url}: unsupported content type {content_type}]"
+            raw = _read_capped(response, deadline=deadline)
+            encoding = response.encoding if "charset" in response.headers.get("Content-Type", "") else None
 
-        text = soup.get_text(separator="\n")
-        lines = [line.strip() for line in text.splitlines() if len(line.strip()) > 40]
-        return "\n".join(lines[:50])  # return first 50 long lines
+        if content_type == "text/plain":
+            lines = _long_lines(raw.decode(encoding or "utf-8", errors="replace").splitlines())
+        elif HAS_LXML:
+            lines = _extract_lxml(raw, encoding)
+        else:
+            lines = _extract_bs4(raw, encoding)
+        return "\n".join(lines)  # return first 50 long lines
     except Exception as e:
         return f"[Failed to extract content from {url}]: {e}"
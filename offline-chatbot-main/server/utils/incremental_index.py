@@ -0,0 +1,112 @@
+# server/utils/incremental_index.py
+#
+# Content-hash manifest for incremental index builds. The manifest records,
+# for every ingested upload, its size, mtime and SHA-256 together with the ids
+# of the chunks it produced. On the next build only new or changed files are
+# extracted and embedded; chunks of changed or deleted files are removed from
+# the ID-mapped FAISS index by id. Ids are never reused, so anything on disk
+# carrying an id that the manifest does not list is stale and can be dropped.
+
+import os
+import json
+import hashlib
+import numpy as np
+import faiss
+from extraction import SUPPORTED_EXTENSIONS
+
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"files": {}, "next_id": 0}
+
+
+def save_manifest(manifest, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def plan_changes(folder, manifest):
+    """
+    Compare the uploads folder with the manifest.
+
+    Returns (changed, removed): `changed` maps relative path -> fingerprint for
+    new or modified files, `removed` lists relative paths that are gone (or
+    modified, since their old chunks must be dropped first). Files whose size
+    and mtime are unchanged are not re-hashed.
+    """
+    known = manifest["files"]
+    seen = set()
+    changed, removed = {}, []
+
+    for root, _, files in os.walk(folder):
+        for file in files:
+            if not file.endswith(SUPPORTED_EXTENSIONS):
+                continue
+            full_path = os.path.join(root, file)
+            rel_path = os.path.relpath(full_path, folder).replace(os.sep, "/")
+            seen.add(rel_path)
+            st = os.stat(full_path)
+            entry = known.get(rel_path)
+            if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+                continue
+            sha = file_sha256(full_path)
+            if entry and entry["sha256"] == sha:
+                entry["mtime"] = st.st_mtime  # touched but identical
+                continue
+            if entry:
+                removed.append(rel_path)
+            changed[rel_path] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": sha}
+
+    removed.extend(path for path in known if path not in seen)
+    return changed, removed
+
+
+def load_index(path, dim):
+    """Load an ID-mapped index from `path`, or None if missing / incompatible."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    index = faiss.read_index(path)
+    if index.d != dim or not isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        print("⚠️ Existing index is not ID-mapped or has another dimension; rebuilding from scratch")
+        return None
+    return index
+
+
+def remove_files(index, manifest, rel_paths):
+    """Drop every chunk produced by `rel_paths` from the index and the manifest."""
+    ids = []
+    for rel_path in rel_paths:
+        entry = manifest["files"].pop(rel_path, None)
+        if entry:
+            ids.extend(entry["chunk_ids"])
+    if ids:
+        index.remove_ids(np.array(ids, dtype="int64"))
+    return len(ids)
+
+
+def reserve_ids(manifest, rel_path, fingerprint, count):
+    """Assign `count` fresh chunk ids to one file and record them in the manifest."""
+    start = manifest["next_id"]
+    ids = list(range(start, start + count))
+    manifest["next_id"] = start + count
+    manifest["files"][rel_path] = dict(fingerprint, chunk_ids=ids)
+    return ids
+
+
+def live_ids(manifest):
+    """Ids of every chunk that belongs to a tracked file."""
+    return {i for entry in manifest["files"].values() for i in entry["chunk_ids"]}
@@ -0,0 +1,171 @@
+# server/utils/index_factory.py
+#
+# Builds the FAISS index from a config string instead of hard-coding
+# IndexFlatL2, so the corpus can move to approximate search as it grows.
+#
+#   INDEX_SPEC=flat          exact search (default)
+#   INDEX_SPEC=ivf           IVF with nlist picked from the corpus size
+#   INDEX_SPEC=hnsw          HNSW graph, 32 links per node
+#   INDEX_SPEC=ivfpq         IVF + product quantization (compact, for millions of chunks)
+#   INDEX_SPEC="IVF4096,PQ32"  any raw faiss.index_factory string
+#
+# Query-time knobs: FAISS_NPROBE (IVF) and FAISS_EF_SEARCH (HNSW).
+
+import os
+import sys
+import json
+import time
+import numpy as np
+import faiss
+
+INDEX_SPEC = os.getenv("INDEX_SPEC", "flat")
+NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))
+
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+
+
+def _nlist_for(n):
+    # ~4*sqrt(n) lists, but keep >= 39 training points per list
+    return int(max(1, min(4 * np.sqrt(n), n // 39)))
+
+
+def resolve_spec(spec, n, dim):
+    """Turn a friendly name into a faiss.index_factory string for n vectors of size dim."""
+    name = (spec or "flat").strip()
+    key = name.lower()
+    if key == "flat":
+        return "Flat"
+    if key == "hnsw":
+        return "HNSW32"
+    if key == "ivf":
+        return f"IVF{_nlist_for(n)},Flat"
+    if key == "ivfpq":
+        m = next((m for m in (64, 32, 16, 8, 4) if dim % m == 0 and dim // m >= 8), 1)
+        # PQ with 8-bit codes needs >= 256 training points per sub-quantizer
+        if n < 256 * 39:
+            print(f"⚠️ Only {n} vectors: too few for IVF-PQ, using IVF instead")
+            return f"IVF{_nlist_for(n)},Flat"
+        return f"IVF{_nlist_for(n)},PQ{m}"
+    return name
+
+
+def needs_training(spec, dim, n=TRAIN_SAMPLE):
+    """Whether an index for `spec` must see sample vectors before anything is added."""
+    return not faiss.index_factory(int(dim), resolve_spec(spec, n, dim)).is_trained
+
+
+def _meta_path(path):
+    return path + ".meta.json"
+
+
+def _train(index, vectors, sample=TRAIN_SAMPLE):
+    n = vectors.shape[0]
+    if n > sample:
+        rows = np.sort(np.random.default_rng(0).choice(n, size=sample, replace=False))
+        train_set = np.ascontiguousarray(vectors[rows], dtype="float32")
+    else:
+        train_set = np.ascontiguousarray(vectors, dtype="float32")
+    print(f"🏋️ Training index on {train_set.shape[0]} vectors ...")
+    index.train(train_set)
+
+
+def create_index(vectors, spec=INDEX_SPEC, metric="l2", trained_path=None, retrain=False):
+    """
+    Create an empty, trained index for `vectors`.
+
+    When `trained_path` is given, the trained (empty) index is persisted there
+    and reused on later builds with the same factory string, dimension and
+    metric, so incremental rebuilds skip training. `retrain` ignores it.
+    """
+    n, dim = vectors.shape
+    factory = resolve_spec(spec, n, dim)
+    meta = {"factory": factory, "dim": int(dim), "metric": metric}
+
+    if trained_path and not retrain and os.path.exists(trained_path) and os.path.exists(_meta_path(trained_path)):
+        with open(_meta_path(trained_path), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        # nlist follows the corpus size: a quantizer trained for another nlist is not reused
+        if saved.get("dim") == meta["dim"] and saved.get("metric") == metric and saved.get("factory") == factory:
+            print(f"♻️ Reusing trained index from {trained_path}")
+            return faiss.read_index(trained_path)
+
+    index = faiss.index_factory(int(dim), factory, METRICS[metric])
+    if not index.is_trained:
+        _train(index, vectors)
+    if trained_path:
+        faiss.write_index(index, trained_path)
+        with open(_meta_path(trained_path), "w", encoding="utf-8") as f:
+            json.dump(dict(meta, spec=spec), f)
+    print(f"📐 Index type: {factory} ({metric})")
+    return index
+
+
+def build_index(vectors, spec=INDEX_SPEC, metric="l2", trained_path=None, batch_size=65536):
+    """Create, train and fill an index for `vectors` (may be a memory map)."""
+    index = create_index(vectors, spec, metric, trained_path)
+    for start in range(0, vectors.shape[0], batch_size):
+        index.add(np.ascontiguousarray(vectors[start:start + batch_size], dtype="float32"))
+    set_search_params(index)
+    return index
+
+
+def set_search_params(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    """Apply query-time parameters (ignored for index types that lack them)."""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # parameter does not apply to this index type
+    return index
+
+
+def evaluate_recall(index, vectors, k=10, n_queries=200, metric="l2"):
+    """
+    Measure recall@k of `index` against exact search over `vectors`, using a
+    sample of the stored vectors as queries. Returns recall and latency.
+    """
+    n, dim = vectors.shape
+    rows = np.sort(np.random.default_rng(1).choice(n, size=min(n_queries, n), replace=False))
+    queries = np.ascontiguousarray(vectors[rows], dtype="float32")
+
+    flat = faiss.IndexFlat(int(dim), METRICS[metric])
+    for start in range(0, n, 65536):
+        flat.add(np.ascontiguousarray(vectors[start:start + 65536], dtype="float32"))
+
+    t0 = time.perf_counter()
+    _, truth = flat.search(queries, k)
+    flat_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    t0 = time.perf_counter()
+    _, found = index.search(queries, k)
+    index_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    hits = sum(len(set(t[t >= 0]) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return {
+        "recall_at_k": round(hits / (len(queries) * min(k, n)), 4),
+        "k": k,
+        "queries": len(queries),
+        "flat_ms_per_query": round(flat_ms, 3),
+        "index_ms_per_query": round(index_ms, 3),
+    }
+
+
+if __name__ == "__main__":
+    # python index_factory.py <vectors.vec> <spec> [nprobe|efSearch ...]
+    from vector_io import load_vectors
+
+    if len(sys.argv) < 3:
+        print("Usage: python index_factory.py <vectors.vec> <spec> [search_param ...]")
+        sys.exit(1)
+    vecs = load_vectors(sys.argv[1])
+    idx = build_index(vecs, sys.argv[2])
+    for value in sys.argv[3:] or [None]:
+        if value is not None:
+            set_search_params(idx, nprobe=int(value), ef_search=int(value))
+        report = evaluate_recall(idx, vecs)
+        print(f"🔎 {sys.argv[2]} param={value}: {report}")
@@ -0,0 +1,241 @@
+# server/utils/inference_scheduler.py
+#
+# Runs blocking model work (translation, retrieval, Llama generation) on
+# dedicated worker threads behind a bounded queue, so the FastAPI event loop
+# only awaits results and stays free for health checks and cheap requests.
+#
+#   SCHEDULER_WORKERS      worker threads (default LLM_WORKERS + 1, at least 2)
+#   SCHEDULER_QUEUE_SIZE   requests allowed to wait; beyond that submit()
+#                          raises QueueFullError (-> HTTP 429)
+#   REQUEST_TIMEOUT        per-request deadline in seconds, queueing included
+#
+# A request whose client disconnects or whose deadline passes is cancelled:
+# it is skipped if still queued, and running work can poll should_stop()
+# (the LLM checks it between tokens) to give its worker back early.
+
+import os
+import time
+import queue
+import asyncio
+import threading
+import concurrent.futures
+
+# One more worker than LLM processes, so translation / retrieval of one
+# request overlaps generation of the others
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "0")) or max(2, int(os.getenv("LLM_WORKERS", "1")) + 1)
+SCHEDULER_QUEUE_SIZE = int(os.getenv("SCHEDULER_QUEUE_SIZE", "16"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "180"))
+POLL_SECONDS = 0.25  # how often waiting requests check for a disconnect
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Cancelled(Exception):
+    pass
+
+
+_current = threading.local()
+
+
+def should_stop():
+    """True if the job running on this thread was cancelled or is past its deadline."""
+    job = getattr(_current, "job", None)
+    return job is not None and job.should_stop()
+
+
+class Job:
+    def __init__(self, fn, args, kwargs, timeout):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued = time.monotonic()
+        self.deadline = self.enqueued + timeout if timeout else None
+        self.future = concurrent.futures.Future()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+        self.future.cancel()  # only succeeds while still queued
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def should_stop(self):
+        return self.cancelled or self.expired()
+
+
+class InferenceScheduler:
+    def __init__(self, workers=SCHEDULER_WORKERS, max_queue=SCHEDULER_QUEUE_SIZE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._running = 0
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0, "expired": 0, "cancelled": 0}
+        self._wait_total = 0.0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"inference-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    # -------------------- worker side --------------------
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if not job.future.set_running_or_notify_cancel():
+                self._count("cancelled")
+                continue
+            if job.cancelled:
+                self._count("cancelled")
+                job.future.set_exception(Cancelled("request was cancelled"))
+                continue
+            if job.expired():
+                self._count("expired")
+                job.future.set_exception(DeadlineExceeded("request timed out waiting for a worker"))
+                continue
+
+            with self._lock:
+                self._running += 1
+                self._wait_total += time.monotonic() - job.enqueued
+            _current.job = job
+            try:
+                job.future.set_result(job.fn(*job.args, **job.kwargs))
+                self._count("completed")
+            except BaseException as e:
+                job.future.set_exception(e)
+                self._count("failed")
+            finally:
+                _current.job = None
+                with self._lock:
+                    self._running -= 1
+
+    # -------------------- caller side --------------------
+    def submit(self, fn, *args, timeout=REQUEST_TIMEOUT, **kwargs):
+        """Queue `fn(*args, **kwargs)`; raises QueueFullError instead of waiting for room."""
+        job = Job(fn, args, kwargs, timeout)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count("rejected")
+            raise QueueFullError(f"Server busy: {self.max_queue} requests already waiting")
+        return job
+
+    async def _wait(self, job, is_disconnected):
+        """Wait for `job`, cancelling it if the client goes away or the deadline passes."""
+        future = asyncio.wrap_future(job.future)
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=POLL_SECONDS)
+                if done:
+                    result = future.result()
+                    if job.expired():
+                        # Work polling should_stop() may have returned early
+                        raise DeadlineExceeded("request timed out")
+                    return result
+                if is_disconnected is not None and await is_disconnected():
+                    job.cancel()
+                    raise Cancelled("client disconnected")
+                if job.expired():
+                    job.cancel()
+                    raise DeadlineExceeded("request timed out")
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+
+    async def run(self, fn, *args, timeout=REQUEST_TIMEOUT, is_disconnected=None, **kwargs):
+        """Run `fn` on a worker and await its result."""
+        job = self.submit(fn, *args, timeout=timeout, **kwargs)
+        return await self._wait(job, is_disconnected)
+
+    def stream(self, gen_fn, *args, timeout=REQUEST_TIMEOUT, is_disconnected=None, **kwargs):
+        """
+        Run the generator `gen_fn(*args, **kwargs)` on a worker and return an
+        async iterator over its items. The job is queued immediately, so
+        QueueFullError is raised here rather than mid-stream.
+        """
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+
+        def pump():
+            gen = gen_fn(*args, **kwargs)
+            try:
+                for item in gen:
+                    loop.call_soon_threadsafe(items.put_nowait, ("item", item))
+                    if should_stop():
+                        break
+            except Exception as e:
+                loop.call_soon_threadsafe(items.put_nowait, ("error", e))
+            finally:
+                gen.close()
+                loop.call_soon_threadsafe(items.put_nowait, ("done", None))
+
+        job = self.submit(pump, timeout=timeout)
+
+        async def iterate():
+            try:
+                while True:
+                    try:
+                        kind, value = await asyncio.wait_for(items.get(), POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        if job.future.done() and not job.future.cancelled() and job.future.exception():
+                            raise job.future.exception()  # never started (expired / cancelled)
+                        if is_disconnected is not None and await is_disconnected():
+                            job.cancel()
+                            return
+                        if job.expired():
+                            job.cancel()
+                            raise DeadlineExceeded("request timed out")
+                        continue
+                    if kind == "item":
+                        yield value
+                    elif kind == "error":
+                        raise value
+                    elif job.expired():
+                        raise DeadlineExceeded("request timed out")
+                    else:
+                        return
+            finally:
+                if not job.future.done():
+                    job.cancel()
+
+        return iterate()
+
+    def stats(self):
+        with self._lock:
+            started = self._counters["completed"] + self._counters["failed"]
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queue_depth": self._queue.qsize(),
+                "queue_limit": self.max_queue,
+                "avg_wait_seconds": round(self._wait_total / started, 3) if started else 0.0,
+                **self._counters,
+            }
+
+    def shutdown(self, wait=True):
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+scheduler = InferenceScheduler()
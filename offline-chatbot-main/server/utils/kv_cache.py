@@ -0,0 +1,188 @@
+# server/utils/kv_cache.py
+#
+# Per-conversation KV-cache reuse for llama_cpp. After each turn the model's
+# state (evaluated tokens + KV cache) is saved under the conversation_id
+# (only for ids the client sent back, see translate.py: one-shot requests
+# would only push real conversations out);
+# before the next turn of the same conversation it is loaded back, and
+# llama_cpp then only evaluates the tokens after the longest common prefix.
+# The prompt puts the stable parts (system message, history) first so that
+# prefix is as long as possible.
+#
+# States live in an LRU bounded by bytes (KV_CACHE_RAM_MB). With KV_CACHE_DIR
+# set, states evicted from RAM are spilled to disk (bounded by
+# KV_CACHE_DISK_MB) and promoted back on use.
+
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+KV_CACHE_RAM_MB = int(os.getenv("KV_CACHE_RAM_MB", "2048"))
+KV_CACHE_DIR = os.getenv("KV_CACHE_DIR")  # unset = RAM only
+KV_CACHE_DISK_MB = int(os.getenv("KV_CACHE_DISK_MB", "8192"))
+
+
+def _state_size(state):
+    """Bytes a stored llama_cpp LlamaState holds: the context blob plus its token and logit arrays."""
+    size = 0
+    for name in ("llama_state", "input_ids", "scores"):
+        value = getattr(state, name, None)
+        if value is not None:
+            size += int(getattr(value, "nbytes", None) or len(value))
+    return size or len(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class ConversationStateCache:
+    """LRU of llama_cpp states keyed by conversation_id, with an optional disk tier."""
+
+    def __init__(self, ram_bytes=KV_CACHE_RAM_MB << 20, disk_dir=KV_CACHE_DIR, disk_bytes=KV_CACHE_DISK_MB << 20):
+        self.ram_bytes = ram_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self._ram = OrderedDict()   # conversation_id -> (state, size)
+        self._ram_used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # -------------------- disk tier --------------------
+    def _disk_path(self, conversation_id):
+        name = hashlib.sha1(conversation_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.state")
+
+    def _spill(self, conversation_id, state):
+        path = self._disk_path(conversation_id)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not spill KV state to disk: {e}")
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".state"):
+                st = os.stat(os.path.join(self.disk_dir, name))
+                entries.append((st.st_mtime, st.st_size, name))
+        used = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if used <= self.disk_bytes:
+                break
+            os.remove(os.path.join(self.disk_dir, name))
+            used -= size
+            self.evictions += 1
+
+    def _load_from_disk(self, conversation_id):
+        path = self._disk_path(conversation_id)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Discarding unreadable KV state {path}: {e}")
+            os.remove(path)
+            return None
+        os.remove(path)  # promoted back to RAM
+        return state
+
+    # -------------------- RAM tier --------------------
+    def get(self, conversation_id):
+        with self._lock:
+            entry = self._ram.get(conversation_id)
+            if entry is not None:
+                self._ram.move_to_end(conversation_id)
+                self.hits += 1
+                return entry[0]
+            state = self._load_from_disk(conversation_id) if self.disk_dir else None
+            if state is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(conversation_id, state)
+            return state
+
+    def put(self, conversation_id, state):
+        with self._lock:
+            self._insert(conversation_id, state)
+
+    def _insert(self, conversation_id, state):
+        old = self._ram.pop(conversation_id, None)
+        if old is not None:
+            self._ram_used -= old[1]
+        size = _state_size(state)
+        if size > self.ram_bytes:
+            # Would evict everything else and still exceed the limit
+            self.evictions += 1
+            if self.disk_dir:
+                self._spill(conversation_id, state)
+            return
+        self._ram[conversation_id] = (state, size)
+        self._ram_used += size
+        while self._ram_used > self.ram_bytes and len(self._ram) > 1:
+            evicted_id, (evicted, evicted_size) = self._ram.popitem(last=False)
+            self._ram_used -= evicted_size
+            self.evictions += 1
+            if self.disk_dir:
+                self._spill(evicted_id, evicted)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "ram_entries": len(self._ram),
+                "ram_mb": round(self._ram_used / (1 << 20), 1),
+                "ram_limit_mb": round(self.ram_bytes / (1 << 20), 1),
+                "disk_dir": self.disk_dir,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / total, 4) if total else 0.0,
+            }
+
+
+kv_cache = ConversationStateCache()
+
+# One generation at a time per model instance: the KV cache is model state
+_llm_locks = {}
+_llm_locks_lock = threading.Lock()
+_active = {}  # id(llm) -> conversation whose state the model currently holds
+
+
+def _lock_for(llm):
+    with _llm_locks_lock:
+        return _llm_locks.setdefault(id(llm), threading.Lock())
+
+
+@contextmanager
+def conversation_session(llm, conversation_id=None, cache=kv_cache):
+    """
+    Run one generation for `conversation_id` on `llm`: restore the
+    conversation's saved state first and save the new one afterwards.
+    Without a conversation_id this only serializes access to the model.
+    """
+    use_cache = bool(conversation_id) and cache.ram_bytes > 0  # KV_CACHE_RAM_MB=0 disables
+    with _lock_for(llm):
+        # Back-to-back turns of one conversation already share the live context
+        if use_cache and _active.get(id(llm)) != conversation_id:
+            state = cache.get(conversation_id)
+            if state is not None:
+                llm.load_state(state)
+        try:
+            yield llm
+        finally:
+            _active[id(llm)] = conversation_id
+            if use_cache:
+                cache.put(conversation_id, llm.save_state())
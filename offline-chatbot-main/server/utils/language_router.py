@@ -0,0 +1,197 @@
+# server/utils/language_router.py
+#
+# The one place that decides what language a request is in and translates
+# it. Languages are identified everywhere by their IndicTrans2 (FLORES) tag,
+# e.g. "hin_Deva" or "eng_Latn"; ISO codes coming from detectors or clients
+# are mapped on the way in with to_tag(). The LLM always works in English, so
+# a request needs at most one translation in (to_english) and one out
+# (from_english), and both are no-ops for English text.
+#
+# Detection looks at Unicode script ranges first: most supported languages
+# are the only one written in their script, so that settles them in a few
+# microseconds. Devanagari is shared by Hindi, Marathi, Nepali and others;
+# there (and only there) a seeded langdetect picks between them, for text
+# long enough to be worth asking. Results are cached per text.
+
+import bisect
+import threading
+from functools import lru_cache
+from langdetect import detect, DetectorFactory
+from server.utils.model_registry import get_seq2seq
+from server.utils.translation_engine import translate_batched
+from server.utils.translation_cache import translation_cache
+
+# ==== Paths ====
+TRANSLATION_MODEL_INDIC_EN = "E:/llm/hf_models/indictrans2/indictrans2-indic-en-dist-200M"
+TRANSLATION_MODEL_EN_INDIC = "E:/llm/hf_models/indictrans2/indictrans2-en-indic-dist-200M"
+
+ENGLISH = "eng_Latn"
+
+# ==== Language Mappings (ISO code -> IndicTrans2 tag) ====
+LANGUAGE_TAGS = {
+    "en": "eng_Latn",
+    "hi": "hin_Deva",
+    "bn": "ben_Beng",
+    "gu": "guj_Gujr",
+    "kn": "kan_Knda",
+    "ml": "mal_Mlym",
+    "mr": "mar_Deva",
+    "or": "ory_Orya",
+    "pa": "pan_Guru",
+    "ta": "tam_Taml",
+    "te": "tel_Telu",
+    "as": "asm_Beng",
+    "ur": "urd_Arab",
+    "kok": "kok_Deva",
+    "ne": "npi_Deva",
+    "mai": "mai_Deva",
+    "sd": "snd_Arab",
+    "sa": "san_Deva",
+    "doi": "doi_Deva",
+    "mni": "mni_Mtei",
+    "bho": "bho_Deva",
+    "ks": "kas_Arab",
+}
+ISO_CODES = {tag: code for code, tag in LANGUAGE_TAGS.items()}
+
+# ==== Scripts ====
+# (first, last, script) code point ranges, sorted. Dandas and Devanagari
+# digits (U+0964-096F) are left out: other Indic scripts use them too.
+SCRIPT_RANGES = [
+    (0x0041, 0x005A, "Latn"),
+    (0x0061, 0x007A, "Latn"),
+    (0x00C0, 0x024F, "Latn"),
+    (0x0600, 0x06FF, "Arab"),
+    (0x0750, 0x077F, "Arab"),
+    (0x0900, 0x0963, "Deva"),
+    (0x0970, 0x097F, "Deva"),
+    (0x0980, 0x09FF, "Beng"),
+    (0x0A00, 0x0A7F, "Guru"),
+    (0x0A80, 0x0AFF, "Gujr"),
+    (0x0B00, 0x0B7F, "Orya"),
+    (0x0B80, 0x0BFF, "Taml"),
+    (0x0C00, 0x0C7F, "Telu"),
+    (0x0C80, 0x0CFF, "Knda"),
+    (0x0D00, 0x0D7F, "Mlym"),
+    (0xABC0, 0xABFF, "Mtei"),
+]
+_RANGE_STARTS = [first for first, _, _ in SCRIPT_RANGES]
+
+# Language assumed for each script unless the statistical model says otherwise
+SCRIPT_DEFAULTS = {
+    "Latn": "eng_Latn",
+    "Arab": "urd_Arab",
+    "Deva": "hin_Deva",
+    "Beng": "ben_Beng",
+    "Guru": "pan_Guru",
+    "Gujr": "guj_Gujr",
+    "Orya": "ory_Orya",
+    "Taml": "tam_Taml",
+    "Telu": "tel_Telu",
+    "Knda": "kan_Knda",
+    "Mlym": "mal_Mlym",
+    "Mtei": "mni_Mtei",
+}
+# English is the only supported Latin-script language, so only Devanagari
+# is worth a second opinion
+AMBIGUOUS_SCRIPTS = {"Deva"}
+DETECT_SAMPLE_CHARS = 256       # enough to find the dominant script
+STATISTICAL_MIN_WORDS = 3       # langdetect is a coin toss on shorter text
+DETECT_CACHE_SIZE = 4096
+
+DetectorFactory.seed = 0  # langdetect is random unless seeded
+
+_stats = {"to_english": 0, "from_english": 0, "skipped": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def to_tag(code):
+    """Canonical tag for an ISO code or tag; anything unsupported is treated as English."""
+    if not code:
+        return ENGLISH
+    if code in ISO_CODES:
+        return code
+    return LANGUAGE_TAGS.get(code.lower(), ENGLISH)
+
+
+def iso_code(tag):
+    """ISO code for a tag, as reported back to clients (`detected_lang`)."""
+    return ISO_CODES.get(tag, "en")
+
+
+def script_of(text):
+    """The script most letters of `text` are written in, or None."""
+    counts = {}
+    for ch in text[:DETECT_SAMPLE_CHARS]:
+        cp = ord(ch)
+        i = bisect.bisect_right(_RANGE_STARTS, cp) - 1
+        if i >= 0 and cp <= SCRIPT_RANGES[i][1]:
+            script = SCRIPT_RANGES[i][2]
+            counts[script] = counts.get(script, 0) + 1
+    return max(counts, key=counts.get) if counts else None
+
+
+def _statistical(text, script):
+    """langdetect's answer if it is a supported language in `script`, else None."""
+    if len(text.split()) < STATISTICAL_MIN_WORDS:
+        return None
+    try:
+        tag = LANGUAGE_TAGS.get(detect(text))
+    except Exception:
+        return None
+    return tag if tag and tag.endswith("_" + script) else None
+
+
+@lru_cache(maxsize=DETECT_CACHE_SIZE)
+def detect_language(text):
+    """Tag of the language `text` is written in (English when unsure)."""
+    script = script_of(text)
+    tag = SCRIPT_DEFAULTS.get(script, ENGLISH)
+    if script in AMBIGUOUS_SCRIPTS:
+        tag = _statistical(text, script) or tag
+    return tag
+
+
+def translate(text, src, tgt):
+    """Translate `text` between two supported languages, one of which is English."""
+    src, tgt = to_tag(src), to_tag(tgt)
+    if src == tgt or not text.strip():
+        _count("skipped")
+        return text
+
+    model_path = TRANSLATION_MODEL_EN_INDIC if src == ENGLISH else TRANSLATION_MODEL_INDIC_EN
+
+    def _run_model(text):
+        try:
+            tokenizer, model = get_seq2seq(model_path)
+            prefix = f"{src}⇒{tgt}: "
+            return translate_batched(tokenizer, model, text, prefix=prefix)
+        except Exception as e:
+            print(f"❌ Translation failed: {e}")
+            return text
+
+    _count("to_english" if tgt == ENGLISH else "from_english")
+    return translation_cache.cached_translate(src, tgt, model_path, text, _run_model)
+
+
+def to_english(text, src):
+    """Inbound hop: the user's text in English."""
+    return translate(text, src, ENGLISH)
+
+
+def from_english(text, tgt):
+    """Outbound hop: an English reply in the user's language."""
+    return translate(text, ENGLISH, tgt)
+
+
+def stats():
+    with _stats_lock:
+        result = dict(_stats)
+    info = detect_language.cache_info()
+    result["detection_cache"] = {"entries": info.currsize, "hits": info.hits, "misses": info.misses}
+    return result
@@ -0,0 +1,255 @@
+# server/utils/llm_pool.py
+#
+# Backends that run the GGUF model for mistral_interface.
+#
+#   LLM_WORKERS=1 (default)  one in-process llama_cpp instance from the
+#                            model registry (the original setup)
+#   LLM_WORKERS=N            N worker processes, each with its own llama_cpp
+#                            instance and KV cache. The GGUF file is
+#                            memory-mapped, so the weights are shared through
+#                            the page cache instead of copied N times.
+#   LLM_THREADS              threads per worker (default: cores / workers)
+#
+# Requests go to the worker with the fewest in-flight requests; among equally
+# loaded workers, the one that served the conversation last is preferred so
+# its saved KV state can be reused. Prompt token counting in the server
+# process uses a vocab-only load of the same GGUF.
+
+import os
+import queue
+import itertools
+import threading
+import multiprocessing
+from collections import OrderedDict
+
+from server.utils.model_registry import LLM_SETTINGS, get_llm, get_model
+from server.utils.kv_cache import conversation_session
+from server.utils.inference_scheduler import should_stop
+from server.utils.llm_worker import worker_main, stopping_criteria
+
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "1"))
+LLM_THREADS = int(os.getenv("LLM_THREADS", "0"))
+AFFINITY_SIZE = 4096  # conversations remembered for worker affinity
+POLL_SECONDS = 0.1
+
+
+# -------------------- In-process backend --------------------
+class LocalLLM:
+    """The registry-owned model in this process."""
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+    @property
+    def llm(self):
+        return get_llm(self.model_path)
+
+    def tokenizer(self):
+        return self.llm
+
+    def n_ctx(self):
+        return self.llm.n_ctx()
+
+    def complete(self, prompt, conversation_id=None, **kwargs):
+        with conversation_session(self.llm, conversation_id) as llm:
+            return llm(prompt, stopping_criteria=stopping_criteria(should_stop), **kwargs)
+
+    def stream(self, prompt, conversation_id=None, **kwargs):
+        with conversation_session(self.llm, conversation_id) as llm:
+            yield from llm(prompt, stream=True, stopping_criteria=stopping_criteria(should_stop), **kwargs)
+
+    def stats(self):
+        return {"backend": "local", "workers": 1}
+
+
+# -------------------- Process pool backend --------------------
+class _Worker:
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.inflight = 0
+        self.served = 0
+        self.pid = None
+        self.ready = False
+        self.alive = False
+        self._send_lock = threading.Lock()
+        self._pending = {}  # request_id -> queue.Queue of messages
+        self._start()
+
+    def _start(self):
+        ctx = self.pool.ctx
+        self.conn, child_conn = ctx.Pipe()
+        self.cancels = ctx.Queue()  # ids of requests to stop; a set in the worker
+        self.process = ctx.Process(
+            target=worker_main,
+            args=(self.pool.model_path, self.pool.settings, child_conn, self.cancels),
+            name=f"llm-worker-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.alive = True
+        threading.Thread(target=self._read, args=(self.conn,), name=f"llm-reader-{self.index}", daemon=True).start()
+
+    def _read(self, conn):
+        while True:
+            try:
+                kind, request_id, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "ready":
+                self.ready, self.pid = True, payload
+                print(f"✅ LLM worker {self.index} ready (pid {payload})")
+                continue
+            with self.pool.lock:
+                target = self._pending.get(request_id)
+                if kind in ("done", "error"):
+                    self._pending.pop(request_id, None)
+                    self.inflight -= 1
+                    self.served += 1
+            if target is not None:
+                target.put((kind, payload))
+
+        # Worker died: fail its requests and start a replacement
+        with self.pool.lock:
+            pending, self._pending = self._pending, {}
+            self.inflight = 0
+            self.alive = self.ready = False
+        for target in pending.values():
+            target.put(("error", "LLM worker exited"))
+        self.process.join(timeout=5)
+        if not self.pool.closing:
+            print(f"⚠️ LLM worker {self.index} exited (code {self.process.exitcode}), restarting")
+            self._start()
+
+    def submit(self, request_id, message):
+        target = queue.Queue()
+        with self.pool.lock:
+            self._pending[request_id] = target
+            self.inflight += 1
+        with self._send_lock:
+            self.conn.send((request_id, *message))
+        return target
+
+    def cancel(self, request_id):
+        self.cancels.put(request_id)
+
+
+class ProcessPoolLLM:
+    def __init__(self, model_path, workers=LLM_WORKERS, threads=LLM_THREADS):
+        self.model_path = model_path
+        threads = threads or max(1, (os.cpu_count() or workers) // workers)
+        self.settings = dict(LLM_SETTINGS, n_threads=threads, use_mmap=True)
+        self.ctx = multiprocessing.get_context("spawn")
+        self.lock = threading.Lock()
+        self.closing = False
+        self._ids = itertools.count(1)
+        self._affinity = OrderedDict()  # conversation_id -> worker index
+        print(f"🔄 Starting {workers} LLM workers with {threads} threads each")
+        self.workers = [_Worker(self, i) for i in range(workers)]
+
+    def tokenizer(self):
+        # Vocabulary only: a few MB, enough to count and cut prompt tokens
+        def _load():
+            from llama_cpp import Llama
+            return Llama(model_path=self.model_path, vocab_only=True, verbose=False)
+        return get_model(f"{self.model_path}#vocab", _load, kind="tokenizer")
+
+    def n_ctx(self):
+        return self.settings["n_ctx"]
+
+    def _pick(self, conversation_id):
+        with self.lock:
+            alive = [w for w in self.workers if w.alive] or self.workers
+            least = min(w.inflight for w in alive)
+            candidates = [w for w in alive if w.inflight == least]
+            preferred = self._affinity.get(conversation_id) if conversation_id else None
+            worker = next((w for w in candidates if w.index == preferred), candidates[0])
+            if conversation_id:
+                self._affinity[conversation_id] = worker.index
+                self._affinity.move_to_end(conversation_id)
+                while len(self._affinity) > AFFINITY_SIZE:
+                    self._affinity.popitem(last=False)
+            return worker
+
+    def _request(self, prompt, conversation_id, stream, kwargs):
+        worker = self._pick(conversation_id)
+        request_id = next(self._ids)
+        replies = worker.submit(request_id, (prompt, kwargs, conversation_id, stream))
+        finished = cancelled = False
+        try:
+            while True:
+                try:
+                    kind, payload = replies.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    if should_stop() and not cancelled:
+                        worker.cancel(request_id)
+                        cancelled = True
+                    continue
+                if kind == "chunk":
+                    yield payload
+                elif kind == "done":
+                    finished = True
+                    if payload is not None:
+                        yield payload
+                    return
+                else:
+                    finished = True
+                    raise RuntimeError(f"LLM worker {worker.index}: {payload}")
+        finally:
+            if not finished and not cancelled:
+                worker.cancel(request_id)  # caller gave up; free the worker
+
+    def complete(self, prompt, conversation_id=None, **kwargs):
+        return next(self._request(prompt, conversation_id, False, kwargs))
+
+    def stream(self, prompt, conversation_id=None, **kwargs):
+        return self._request(prompt, conversation_id, True, kwargs)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": "process_pool",
+                "workers": [
+                    {"index": w.index, "pid": w.pid, "ready": w.ready, "alive": w.alive,
+                     "inflight": w.inflight, "served": w.served}
+                    for w in self.workers
+                ],
+                "threads_per_worker": self.settings["n_threads"],
+            }
+
+    def close(self):
+        self.closing = True
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=10)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(model_path, workers=LLM_WORKERS):
+    """The shared LLM backend for `model_path` (in-process or a worker pool)."""
+    with _backends_lock:
+        backend = _backends.get(model_path)
+        if backend is None:
+            backend = LocalLLM(model_path) if workers <= 1 else ProcessPoolLLM(model_path, workers)
+            _backends[model_path] = backend
+        return backend
+
+
+def backend_stats():
+    with _backends_lock:
+        return {os.path.basename(path): backend.stats() for path, backend in _backends.items()}
+
+
+def close_backends():
+    with _backends_lock:
+        for backend in _backends.values():
+            if hasattr(backend, "close"):
+                backend.close()
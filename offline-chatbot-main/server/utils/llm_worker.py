@@ -0,0 +1,69 @@
+# server/utils/llm_worker.py
+#
+# Entry point of an LLM worker process (see llm_pool.py). Kept separate so a
+# spawned worker only imports llama_cpp and the KV cache, not the server.
+
+import os
+import queue
+
+from server.utils.kv_cache import conversation_session
+
+
+def stopping_criteria(check):
+    """llama_cpp stopping criterion that ends generation once `check()` is true."""
+    from llama_cpp import StoppingCriteriaList
+    return StoppingCriteriaList([lambda input_ids, logits: check()])
+
+
+MAX_CANCELLED = 1024  # cancels kept for requests that already finished
+
+
+def worker_main(model_path, settings, conn, cancels):
+    """
+    Worker process: serve (request_id, prompt, kwargs, conversation_id, stream)
+    requests one at a time. Ids put on the `cancels` queue stop (or skip)
+    those requests.
+    """
+    from llama_cpp import Llama
+
+    llm = Llama(model_path=model_path, **settings)
+    cancelled = set()
+    current = [None]
+
+    def is_cancelled(request_id):
+        while True:
+            try:
+                cancelled.add(cancels.get_nowait())
+            except queue.Empty:
+                return request_id in cancelled
+
+    stop = stopping_criteria(lambda: is_cancelled(current[0]))
+    conn.send(("ready", None, os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        request_id, prompt, kwargs, conversation_id, stream = message
+        current[0] = request_id
+        if is_cancelled(request_id):
+            cancelled.discard(request_id)
+            conn.send(("error", request_id, "cancelled"))
+            continue
+        try:
+            with conversation_session(llm, conversation_id):
+                if stream:
+                    for chunk in llm(prompt, stream=True, stopping_criteria=stop, **kwargs):
+                        conn.send(("chunk", request_id, chunk))
+                    conn.send(("done", request_id, None))
+                else:
+                    conn.send(("done", request_id, llm(prompt, stopping_criteria=stop, **kwargs)))
+        except Exception as e:
+            conn.send(("error", request_id, f"{type(e).__name__}: {e}"))
+        cancelled.discard(request_id)
+        if len(cancelled) > MAX_CANCELLED:
+            # Cancels that arrived after their request finished
+            cancelled = {i for i in cancelled if i > request_id}
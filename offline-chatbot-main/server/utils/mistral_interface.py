@@ -4,232 +4,352 @@ import os
 import json
 import numpy as np
 import faiss
-import torch
-from langdetect import detect
-from sentence_transformers import SentenceTransformer
-from llama_cpp import Llama
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-import tiktoken
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from server.utils.web_fetcher import fetch_web_results
+from server.utils.vector_io import load_or_import, write_vectors, read_faiss_index, write_faiss_index
+from server.utils.index_factory import build_index, create_index, set_search_params, INDEX_SPEC
+from server.utils.model_registry import get_embedder
+from server.utils.language_router import to_tag, detect_language, to_english, from_english
+from server.utils.retrieval_cache import retrieval_cache
+from server.utils.prompt_budget import token_counter, allocate, SECTION_SHARES
+from server.utils.retrieval_gate import retrieval_gate
+from server.utils.bm25_index import load_bm25, reciprocal_rank_fusion
+from server.utils.llm_pool import get_backend
+from server.utils.conversation_store import conversation_store
 
 
 # ==== Paths ====
-VECTOR_PATH = "E:/chatbot_data/vectorstore/vector_index.json"
+VECTOR_PATH = "E:/chatbot_data/vectorstore/vector_index.vec"
+VECTOR_JSON_PATH = "E:/chatbot_data/vectorstore/vector_index.json"  # legacy, imported once
+FAISS_INDEX_PATH = "E:/chatbot_data/vectorstore/vector_index.faiss"
 TEXT_MAP_PATH = "E:/chatbot_data/vectorstore/text_map.json"
+BM25_INDEX_PATH = "E:/chatbot_data/vectorstore/bm25.idx"
 LOCAL_MODEL_PATH = "E:/llm/models/Meta-Llama-3-8B-Instruct.Q4_K_M.gguf"
-TRANSLATION_MODEL_INDIC_EN = "E:/llm/hf_models/indictrans2/indictrans2-indic-en-dist-200M"
-TRANSLATION_MODEL_EN_INDIC = "E:/llm/hf_models/indictrans2/indictrans2-en-indic-dist-200M"
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
-# -------------------- Translator --------------------
-class Translator:
-    def __init__(self, model_path):
-        if not os.path.isdir(model_path):
-            raise FileNotFoundError(f"❌ Translation model path not found: {model_path}")
-        try:
-            print(f"🔄 Loading translation model from: {model_path}")
-            self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True, trust_remote_code=True)
-            self.model = AutoModelForSeq2SeqLM.from_pretrained(model_path, local_files_only=True, trust_remote_code=True)
-            self.model.eval()
-            print(f"✅ Loaded translation model: {os.path.basename(model_path)}")
-        except Exception as e:
-            print(f"❌ Could not load model from {model_path}: {e}")
-            self.tokenizer, self.model = None, None
-
-    def translate(self, text: str) -> str:
-        if not self.tokenizer or not self.model:
-            print("⚠️ Skipping translation: model not loaded")
-            return text
-        try:
-            inputs = self.tokenizer([text], return_tensors="pt", padding=True, truncation=True)
-            with torch.no_grad():
-                outputs = self.model.generate(**inputs, max_length=512)
-            return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)[0]
-        except Exception as e:
-            print(f"❌ Translation error: {e}")
-            return text
-
-# Load translators
-to_english = Translator(TRANSLATION_MODEL_INDIC_EN)
-to_local   = Translator(TRANSLATION_MODEL_EN_INDIC)
-
 # -------------------- Load Embedder --------------------
-embedder = SentenceTransformer("distiluse-base-multilingual-cased-v2")
+EMBEDDER_MODEL = "distiluse-base-multilingual-cased-v2"
+embedder = get_embedder(EMBEDDER_MODEL)
 embedder_dim = embedder.get_sentence_embedding_dimension()
 
 # -------------------- Load or Rebuild FAISS --------------------
-with open(VECTOR_PATH, "r", encoding="utf-8") as f:
-    embeddings = json.load(f)
-
-if not embeddings or not isinstance(embeddings, list):
-    raise ValueError("❌ vector_index.json is empty or malformed.")
-
-embeddings_np = np.array(embeddings, dtype="float32")
-stored_dim = embeddings_np.shape[1]
-
-if stored_dim != embedder_dim:
-    print(f"⚠️ Dimension mismatch: Stored={stored_dim}, Embedder={embedder_dim}")
+def _index_signature():
+    """Identifies the on-disk index; changes whenever the index is rewritten."""
+    try:
+        st = os.stat(FAISS_INDEX_PATH)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+# Serializes reloads: scheduler workers all notice a new index at once
+_reload_lock = threading.Lock()
+index = None
+
+def load_vector_store():
+    """
+    (Re)load the FAISS index, text map and BM25 index. The index files belong
+    to the offline builder: if the saved index does not match the text map,
+    a reload keeps serving the loaded index, and only the first load (with
+    nothing to serve yet) rebuilds one in memory.
+    """
+    global index, text_map, index_version, bm25
+
+    # Taken first, so a build finishing during the load triggers another one
+    signature = _index_signature()
     with open(TEXT_MAP_PATH, "r", encoding="utf-8") as f:
-        text_map = json.load(f)
-    texts = [text_map[str(i)] for i in range(len(text_map))]
-    new_embeddings = embedder.encode(texts, convert_to_numpy=True, normalize_embeddings=False)
-    embeddings_np = np.array(new_embeddings, dtype="float32")
-    with open(VECTOR_PATH, "w", encoding="utf-8") as f:
-        json.dump(embeddings_np.tolist(), f, ensure_ascii=False, indent=2)
-    print("✅ vector_index.json updated with correct dimensions.")
-
-index = faiss.IndexFlatL2(embedder_dim)
-index.add(embeddings_np)
-
-with open(TEXT_MAP_PATH, "r", encoding="utf-8") as f:
-    text_map = json.load(f)
-if not text_map or not isinstance(text_map, dict):
-    raise ValueError("❌ text_map.json is empty or malformed.")
-
-# -------------------- Load GGUF Model --------------------
-print(f"🧠 Loading GGUF model from: {LOCAL_MODEL_PATH}")
-llm = Llama(
-    model_path=LOCAL_MODEL_PATH,
-    n_ctx=4096,
-    n_threads=4,
-    n_batch=128,
-    use_mlock=False,
-    verbose=False
-)
-print("✅ GGUF model loaded successfully!")
-
-# -------------------- Token Counter --------------------
-def estimate_token_count(text: str) -> int:
+        new_text_map = json.load(f)
+    if not new_text_map or not isinstance(new_text_map, dict):
+        raise ValueError("❌ text_map.json is empty or malformed.")
+
+    # The saved index is authoritative; incremental builds keep it ID-mapped
+    # to the text_map keys, which need not be contiguous.
+    new_index = None
+    if signature is not None and signature[1] > 0:
+        new_index = read_faiss_index(FAISS_INDEX_PATH)
+        if new_index.d != embedder_dim or new_index.ntotal != len(new_text_map):
+            print(f"⚠️ Saved FAISS index ({new_index.ntotal} x {new_index.d}) does not match "
+                  f"text_map.json ({len(new_text_map)} chunks)")
+            new_index = None
+
+    if new_index is None:
+        if index is not None:
+            print("⚠️ Keeping the loaded FAISS index until the next build")
+            index_version = signature
+            return
+        print("⚠️ Rebuilding the FAISS index in memory from the vector store")
+        new_index = _rebuild_index(new_text_map)
+        if signature is None:
+            write_faiss_index(new_index, FAISS_INDEX_PATH)
+            signature = _index_signature()
+    set_search_params(new_index)
+
+    # Written before the FAISS index by the build, so it is current here.
+    # Without one, retrieval is dense only.
+    new_bm25 = load_bm25(BM25_INDEX_PATH)
+    if new_bm25 is None:
+        print("⚠️ No BM25 index; searching FAISS only")
+
+    index, text_map, bm25 = new_index, new_text_map, new_bm25
+    # The retrieval cache is keyed on this, so swapping the index invalidates it
+    index_version = signature
+
+def _rebuild_index(text_map):
+    """Build an index from the raw vector file, re-embedding the texts if it doesn't fit."""
+    ids = sorted(int(k) for k in text_map)
     try:
-        enc = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    except Exception:
-        enc = tiktoken.get_encoding("cl100k_base")
-    return len(enc.encode(text))
+        embeddings_np = load_or_import(VECTOR_PATH, VECTOR_JSON_PATH)
+    except FileNotFoundError:
+        embeddings_np = None
+
+    # Row i of the vector file holds chunk id i
+    if embeddings_np is not None and (embeddings_np.shape[1] != embedder_dim or embeddings_np.shape[0] <= ids[-1]):
+        print(f"⚠️ Vector store shape {embeddings_np.shape} does not cover "
+              f"ids up to {ids[-1]} x {embedder_dim} dims, re-embedding")
+        embeddings_np = None
+
+    if embeddings_np is None:
+        texts = [text_map[str(i)] for i in ids]
+        embeddings_np = embedder.encode(texts, convert_to_numpy=True, normalize_embeddings=False)
+        # Never replace a vector file the builder wrote
+        if ids == list(range(len(ids))) and not os.path.exists(VECTOR_PATH):
+            write_vectors(VECTOR_PATH, embeddings_np)
+            embeddings_np = load_or_import(VECTOR_PATH)
+            print("✅ Vector store updated with correct dimensions.")
+    elif embeddings_np.shape[0] != len(ids):
+        embeddings_np = embeddings_np[ids]
+
+    if ids == list(range(len(ids))):
+        return build_index(embeddings_np, INDEX_SPEC)
+    new_index = faiss.IndexIDMap2(create_index(embeddings_np, INDEX_SPEC))
+    new_index.add_with_ids(np.ascontiguousarray(embeddings_np, dtype="float32"), np.array(ids, dtype="int64"))
+    return new_index
+
+load_vector_store()
+
+# -------------------- Cached Retrieval --------------------
+# Runs BM25 next to the FAISS search
+_search_pool = ThreadPoolExecutor(max_workers=int(os.getenv("BM25_WORKERS", "2")), thread_name_prefix="bm25")
+
+def embed_query(query: str):
+    """The (1, dim) float32 embedding of `query`."""
+    return embedder.encode([query], convert_to_numpy=True).astype("float32")
+
+def search_index(query: str, k: int = 8, query_vector=None):
+    """
+    Embed `query` (unless its `query_vector` is given) and return
+    (query_vector, D, I) from FAISS, reusing cached results for repeated
+    queries. A rebuilt index on disk is picked up here.
+    """
+    global index_version
+    if _index_signature() != index_version:
+        with _reload_lock:
+            if _index_signature() != index_version:
+                print("🔄 FAISS index changed on disk, reloading")
+                try:
+                    load_vector_store()
+                except (OSError, ValueError, RuntimeError) as e:
+                    print(f"⚠️ Reload failed ({e}); keeping the loaded FAISS index until the next build")
+                    index_version = _index_signature()
+
+    version = index_version
+    cached = retrieval_cache.get(version, query, k)
+    if cached is not None:
+        return cached
+
+    if query_vector is None:
+        query_vector = embed_query(query)
+    D, I = index.search(query_vector, k=k)
+    retrieval_cache.put(version, query, k, query_vector, D, I)
+    return query_vector, D, I
+
+# -------------------- GGUF Model --------------------
+def get_local_llm():
+    """
+    The shared LLM backend: the registry-owned model in this process, or a
+    pool of worker processes when LLM_WORKERS > 1. Either way the model is
+    loaded on the first request.
+    """
+    return get_backend(LOCAL_MODEL_PATH)
 
 # -------------------- Prompts --------------------
-LANG_PROMPTS = {
-    "hi": "आप एक मददगार और विशेषज्ञ सहायक हैं। कृपया उत्तर केवल हिंदी में दें।",
-    "te": "మీరు సహాయక మరియు నిపుణుడు. దయచేసి సమాధానాన్ని పూర్తిగా తెలుగులో ఇవ్వండి.",
-    "ta": "நீங்கள் ஒரு உதவிகரமான மற்றும் நிபுணரான உதவியாளர். தயவுசெய்து பதில்களை முழுவதும் தமிழில் அளிக்கவும்.",
-    "bn": "আপনি একজন সহায়ক এবং বিশেষজ্ঞ সহকারী। দয়া করে উত্তরটি পুরোপুরি বাংলায় দিন।",
-    "ur": "آپ ایک مددگار اور ماہر معاون ہیں۔ براہ کرم جواب مکمل طور پر اردو میں دیں۔",
-    "default": "You are a helpful and expert assistant. Please answer entirely in English."
+# The model always reads and answers in English; language_router translates
+# the query in and the reply out.
+DEFAULT_SYSTEM_MESSAGE = "You are a helpful and expert assistant. Please answer entirely in English."
+
+GENERATION_KWARGS = {
+    "max_tokens": 1024,
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "stop": ["User:", "Assistant:"],
 }
 
-# -------------------- Main Answer Function --------------------
-def generate_answer(user_query: str, conversation_history: list = [], images: list = [], lang: str = None, system_message: str = None, model_name: str = "Meta-Llama-3-8B-Instruct"):
-    print("✅ Starting generate_answer")
+# -------------------- Prompt Assembly --------------------
+def render_prompt(system_message: str, image_note: str, history_text: str, web_context: str, faiss_context: str, query: str) -> str:
+    # Stable parts first (system message, then history, which only grows
+    # between turns) so the KV cache of the previous turn covers them;
+    # per-request context and the user turn come last.
+    context = f"🌐 From Web Search:\n{web_context}\n\n📁 From Internal Knowledge:\n{faiss_context}"
+    return f"""{system_message}
+
+Previous conversation:
+{history_text}
 
-    # Detect language safely
-    if not lang:
+Context:
+{context}
+{image_note}
+User: {query}
+Assistant:"""
+
+def retrieve(query: str, web_context: str = None, k: int = 8, query_vector=None):
+    """
+    FAISS and BM25 hits for the English `query`, merged by reciprocal-rank
+    fusion, plus web results if the retrieval gate finds the local hits too
+    weak (or `web_context` when the caller already fetched it). Pass
+    `query_vector` when the query was already embedded. Returns a dict with
+    the chunks, the FAISS distances, the web context and the gate's
+    decision.
+    """
+    # BM25 runs while the query is embedded and searched in FAISS
+    lexical_index = bm25
+    lexical = _search_pool.submit(lexical_index.search, query, k) if lexical_index is not None else None
+    _, D, I = search_index(query, k=k, query_vector=query_vector)
+    dense = [(float(d), str(i)) for d, i in zip(D[0], I[0]) if str(i) in text_map]
+    distances = [d for d, _ in dense]
+
+    lexical_ids, lexical_match = [], None
+    if lexical is not None:
         try:
-            # use detect only when query is reasonably long
-            lang = detect(user_query) if len(user_query.split()) > 1 else "en"
-        except Exception:
-            lang = "en"
-    print(f"🌐 Using language code: {lang}")
+            ids, _, lexical_match = lexical.result()
+            lexical_ids = [str(i) for i in ids if str(i) in text_map]
+        except Exception as e:
+            print(f"⚠️ BM25 search failed: {e}")
+    fused = reciprocal_rank_fusion([[i for _, i in dense], lexical_ids], limit=k)
+    chunks = [text_map[i] for i in fused]
+    print(f"✅ Retrieved {len(dense)} FAISS + {len(lexical_ids)} BM25 results, {len(chunks)} after fusion")
+
+    if web_context is not None:
+        decision = {"policy": "provided", "use_web": True, "reason": "provided"}
+    else:
+        llm = get_local_llm()
+        counter = token_counter(llm.tokenizer())
+        budget = int((llm.n_ctx() - GENERATION_KWARGS["max_tokens"]) * SECTION_SHARES["faiss"])
+        decision = retrieval_gate.decide(
+            distances, [counter.count(text_map[i]) for _, i in dense], budget, lexical=lexical_match
+        )
+        web_context = ""
+        if decision["use_web"]:
+            try:
+                web_context = fetch_web_results(query) or ""
+            except Exception as e:
+                print(f"⚠️ Web fetch failed: {e}")
+    print(f"🧭 Retrieval: {decision}")
+
+    return {"chunks": chunks, "distances": distances, "web_context": web_context, "decision": decision}
+
+def build_prompt(user_query: str, conversation_history: list = None, images: list = [], lang: str = None, system_message: str = None, web_context: str = None, conversation_id: str = None, instruction: str = None, retrieval: dict = None):
+    """
+    Detect the language (unless `lang` is given), translate the query to
+    English once, gather FAISS (+ web, if needed) context and return
+    (lang, prompt, max_tokens, retrieval). Sections are fitted to the
+    model's context window with its own tokenizer; the user turn is never
+    cut. Pass `web_context` to use already-fetched web results instead of
+    searching, or `retrieval` (from retrieve()) to skip retrieval entirely.
+    Without `conversation_history`, the server-side history of
+    `conversation_id` is used. `instruction` is appended to the user turn
+    but not searched for.
+    """
+    # Canonical IndicTrans2 tag; ISO codes are accepted too
+    lang = to_tag(lang) if lang else detect_language(user_query)
+    print(f"🌐 Using language: {lang}")
 
     if not system_message:
-        system_message = LANG_PROMPTS.get(lang, LANG_PROMPTS["default"])
+        system_message = DEFAULT_SYSTEM_MESSAGE
 
-    # Translate query if needed (handle translation errors gracefully)
-    try:
-        translated_query = to_english.translate(user_query) if lang != "en" else user_query
-    except Exception as e:
-        print(f"⚠️ Translation-to-English failed: {e}")
-        translated_query = user_query
-
-    # Embed & search FAISS
-    embedded_query = embedder.encode([translated_query], convert_to_numpy=True)
-    print("✅ Embedded user query")
-    D, I = index.search(embedded_query.astype("float32"), k=8)
-    retrieved_chunks = [text_map[str(i)] for i in I[0] if str(i) in text_map]
-
-    # Trim FAISS context to a token budget
-    MAX_FAISS_TOKENS = 600
-    faiss_context_parts = []
-    current_tokens = 0
-    for chunk in retrieved_chunks:
-        chunk_tokens = estimate_token_count(chunk)
-        if current_tokens + chunk_tokens > MAX_FAISS_TOKENS:
-            break
-        faiss_context_parts.append(chunk)
-        current_tokens += chunk_tokens
-    faiss_context = "\n".join(faiss_context_parts)
-
-    if len(faiss_context.strip()) < 100 or np.mean(D[0]) > 0.7:
-        print("⚠️ Weak FAISS results.")
-
-    # Fetch & trim web search context
-    try:
-        web_context_full = fetch_web_results(translated_query) or ""
-    except Exception as e:
-        print(f"⚠️ Web fetch failed: {e}")
-        web_context_full = ""
-    MAX_WEB_TOKENS = 600
-    web_context_tokens = web_context_full.split()
-    if len(web_context_tokens) > MAX_WEB_TOKENS:
-        web_context = " ".join(web_context_tokens[:MAX_WEB_TOKENS])
-    else:
-        web_context = web_context_full
+    # The one inbound translation (a no-op for English)
+    translated_query = to_english(user_query, lang)
 
-    # Build context
-    context = f"🌐 From Web Search:\n{web_context}\n\n📁 From Internal Knowledge:\n{faiss_context}"
+    if retrieval is None:
+        retrieval = retrieve(translated_query, web_context)
+    retrieved_chunks = retrieval["chunks"]
+    web_context = retrieval["web_context"]
+    user_turn = f"{translated_query}\n\n{instruction}" if instruction else translated_query
 
     # Image note
     image_note = f"\nNote: User uploaded {len(images)} image(s)." if images else ""
 
-    # Trim conversation history
-    MAX_HISTORY_TOKENS = 400
-    history_parts = []
-    hist_tokens = 0
-    for msg in reversed(conversation_history):
-        entry = f"{msg.get('role', 'user')}: {msg.get('content', '')}\n"
-        entry_tokens = estimate_token_count(entry)
-        if hist_tokens + entry_tokens > MAX_HISTORY_TOKENS:
-            break
-        history_parts.insert(0, entry)
-        hist_tokens += entry_tokens
-    history_text = "".join(history_parts)
-
-    # Build final prompt
-    prompt = f"""{system_message}
-{image_note}
-
-Previous conversation:
-{history_text}
-
-Context:
-{context}
-
-User: {translated_query}
-Assistant:"""
+    llm = get_local_llm()
+    counter = token_counter(llm.tokenizer())
 
-    # Ensure total tokens fit
-    MAX_PROMPT_TOKENS = 3000
-    total_tokens = estimate_token_count(prompt)
-    if total_tokens > MAX_PROMPT_TOKENS:
-        print(f"⚠️ Trimming prompt from {total_tokens} to {MAX_PROMPT_TOKENS} tokens")
-        prompt_words = prompt.split()
-        prompt = " ".join(prompt_words[:MAX_PROMPT_TOKENS])
+    # Newest messages first, so the oldest are the ones dropped
+    if conversation_history is not None:
+        history_entries = [f"{msg.get('role', 'user')}: {msg.get('content', '')}\n" for msg in reversed(conversation_history)]
+        history = (history_entries, False)
+    elif conversation_id:
+        history_entries, history_counts = conversation_store.history(conversation_id, counter)
+        history = (history_entries, False, history_counts)
+    else:
+        history = ([], False)
+
+    # Split the context window between the sections
+    fitted, max_tokens, report = allocate(
+        counter,
+        n_ctx=llm.n_ctx(),
+        max_new_tokens=GENERATION_KWARGS["max_tokens"],
+        fixed_text=render_prompt(system_message, image_note, "", "", "", user_turn),
+        sections={
+            "history": history,
+            "faiss": (retrieved_chunks, True),
+            "web": ([web_context] if web_context.strip() else [], True),
+        },
+    )
+    print(f"🧮 Prompt budget: {report}")
+
+    prompt = render_prompt(
+        system_message,
+        image_note,
+        "".join(reversed(fitted["history"])),
+        "".join(fitted["web"]),
+        "\n".join(fitted["faiss"]),
+        user_turn,
+    )
+    return lang, prompt, max_tokens, retrieval
 
+# -------------------- Main Answer Function --------------------
+def generate_answer(user_query: str, conversation_history: list = None, images: list = [], lang: str = None, system_message: str = None, model_name: str = "Meta-Llama-3-8B-Instruct", web_context: str = None, conversation_id: str = None, instruction: str = None, retrieval: dict = None):
+    print("✅ Starting generate_answer")
+    lang, prompt, max_tokens, retrieval = build_prompt(user_query, conversation_history, images, lang, system_message, web_context, conversation_id, instruction, retrieval)
     print("✅ Prompt ready, generating with model:", model_name)
 
-    # Generate
-    output = llm(prompt, max_tokens=1024, temperature=0.7, top_p=0.95, stop=["User:", "Assistant:"])
+    # Generate, resuming from this conversation's cached KV state
+    output = get_local_llm().complete(prompt, conversation_id, **dict(GENERATION_KWARGS, max_tokens=max_tokens))
     reply = output["choices"][0]["text"].strip()
 
-    # Translate reply back if needed
-    if lang != "en":
-        try:
-            reply = to_local.translate(reply)
-        except Exception as e:
-            print(f"⚠️ Translation-to-local failed: {e}")
+    # The one outbound translation (a no-op for English)
+    reply = from_english(reply, lang)
 
     return {
         "input_language": lang,
         "user_input": user_query,
         "reply": reply,
-        "model_used": model_name
+        "model_used": model_name,
+        "retrieval": retrieval["decision"]
     }
+
+
+# -------------------- Streaming Answer --------------------
+def stream_answer(user_query: str, conversation_history: list = None, images: list = [], lang: str = None, system_message: str = None, model_name: str = "Meta-Llama-3-8B-Instruct", web_context: str = None, conversation_id: str = None, instruction: str = None, retrieval: dict = None):
+    """
+    Same pipeline as generate_answer, but yields the reply text piece by piece
+    as llama_cpp produces tokens. The pieces are the model's raw (English)
+    output; translating them back is left to the caller.
+    """
+    print("✅ Starting stream_answer")
+    _, prompt, max_tokens, _ = build_prompt(user_query, conversation_history, images, lang, system_message, web_context, conversation_id, instruction, retrieval)
+    print("✅ Prompt ready, streaming with model:", model_name)
+
+    for chunk in get_local_llm().stream(prompt, conversation_id, **dict(GENERATION_KWARGS, max_tokens=max_tokens)):
+        text = chunk["choices"][0]["text"]
+        if text:
+            yield text
@@ -0,0 +1,148 @@
+# server/utils/model_registry.py
+#
+# Process-wide registry of heavy models (GGUF LLM, IndicTrans2 translators,
+# sentence embedder). Each model is loaded once, on first use, and the same
+# instance is handed to every caller.
+
+import os
+import time
+import threading
+
+_models = {}
+_lock = threading.RLock()
+
+# ==== Default LLM settings (shared by every caller) ====
+LLM_SETTINGS = {
+    "n_ctx": 4096,
+    "n_threads": 4,
+    "n_batch": 128,
+    "use_mlock": False,
+    "verbose": False,
+}
+
+
+class _Entry:
+    def __init__(self, name, kind, model, load_seconds, memory_bytes):
+        self.name = name
+        self.kind = kind
+        self.model = model
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+
+
+def get_model(name, loader, kind="model", memory=None):
+    """
+    Return the model registered under `name`, calling `loader()` to build it
+    the first time. Concurrent first calls block until the single load is done.
+    """
+    entry = _models.get(name)
+    if entry is not None:
+        return entry.model
+    with _lock:
+        entry = _models.get(name)
+        if entry is None:
+            print(f"🔄 Loading {kind}: {name}")
+            start = time.perf_counter()
+            model = loader()
+            elapsed = time.perf_counter() - start
+            try:
+                memory_bytes = memory(model) if memory else _estimate_memory(model)
+            except Exception:
+                memory_bytes = None
+            entry = _Entry(name, kind, model, elapsed, memory_bytes)
+            _models[name] = entry
+            print(f"✅ Loaded {kind}: {os.path.basename(str(name))} in {elapsed:.1f}s")
+        return entry.model
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def unload(name):
+    """Drop a model from the registry so it can be garbage-collected."""
+    with _lock:
+        _models.pop(name, None)
+
+
+# -------------------- Typed helpers --------------------
+def get_llm(model_path, **overrides):
+    """Shared llama_cpp model for `model_path` (settings from the first caller win)."""
+    def _load():
+        from llama_cpp import Llama
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(f"❌ GGUF model not found: {model_path}")
+        settings = dict(LLM_SETTINGS, **overrides)
+        return Llama(model_path=model_path, **settings)
+
+    return get_model(model_path, _load, kind="llm", memory=lambda _: os.path.getsize(model_path))
+
+
+def get_seq2seq(model_path):
+    """Shared (tokenizer, model) pair for an IndicTrans2 checkpoint directory."""
+    def _load():
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+        if not os.path.isdir(model_path):
+            raise FileNotFoundError(f"❌ Translation model path not found: {model_path}")
+        tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True, trust_remote_code=True)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_path, local_files_only=True, trust_remote_code=True)
+        model.eval()
+        return tokenizer, model
+
+    return get_model(model_path, _load, kind="translator", memory=lambda pair: _torch_bytes(pair[1]))
+
+
+def get_embedder(model_name):
+    """Shared SentenceTransformer instance."""
+    def _load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    return get_model(model_name, _load, kind="embedder", memory=_torch_bytes)
+
+
+# -------------------- Reporting --------------------
+def _torch_bytes(module):
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def _estimate_memory(model):
+    if hasattr(model, "parameters"):
+        return _torch_bytes(model)
+    return None
+
+
+def _process_rss():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        import resource
+        # ru_maxrss is KiB on Linux (peak, not current, but close enough here)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return None
+
+
+def loaded_models():
+    """Report what is loaded, how long it took and roughly how much memory it uses."""
+    with _lock:
+        entries = list(_models.values())
+    rss = _process_rss()
+    return {
+        "models": [
+            {
+                "name": e.name,
+                "kind": e.kind,
+                "load_seconds": round(e.load_seconds, 2),
+                "memory_mb": round(e.memory_bytes / 2**20, 1) if e.memory_bytes is not None else None,
+            }
+            for e in entries
+        ],
+        "process_rss_mb": round(rss / 2**20, 1) if rss else None,
+    }
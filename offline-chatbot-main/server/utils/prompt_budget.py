@@ -0,0 +1,178 @@
+# server/utils/prompt_budget.py
+#
+# Token budgeting for the RAG prompt. Tokens are counted with the loaded
+# model's own tokenizer (llama_cpp), and counts are cached per text so a
+# history message or FAISS chunk is tokenized once, not once per request.
+#
+# One total budget, the model's context window, is split as:
+#   fixed parts (system prompt, template, user turn)  - always included
+#   generation headroom                               - GENERATION max_tokens
+#   history / FAISS / web context                     - whatever is left,
+#       divided by SECTION_SHARES; a section that needs less than its share
+#       hands the rest to the others.
+# The user turn is never truncated. If it does not fit, PromptTooLongError.
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "8192"))
+MIN_GENERATION_TOKENS = int(os.getenv("MIN_GENERATION_TOKENS", "256"))
+MIN_PIECE_TOKENS = 32   # don't bother with a truncated tail shorter than this
+SAFETY_MARGIN = 16      # token merges across section boundaries
+
+SECTION_SHARES = {"history": 0.2, "faiss": 0.45, "web": 0.35}
+
+
+class PromptTooLongError(ValueError):
+    pass
+
+
+class TokenCounter:
+    """Exact token counts for one tokenizer, with an LRU cache of per-text counts."""
+
+    def __init__(self, tokenize, detokenize, max_entries=TOKEN_CACHE_SIZE):
+        self._tokenize = tokenize
+        self._detokenize = detokenize
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text):
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def count(self, text):
+        if not text:
+            return 0
+        key = self._key(text)
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return count
+        count = len(self._tokenize(text))
+        with self._lock:
+            self.misses += 1
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def truncate(self, text, max_tokens):
+        """The longest prefix of `text` that fits in `max_tokens` tokens."""
+        if self.count(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        return self._detokenize(self._tokenize(text)[:max_tokens])
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._counts),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def token_counter(llm):
+    """The shared TokenCounter for a llama_cpp model (one per model file)."""
+    key = getattr(llm, "model_path", None) or id(llm)
+    with _counters_lock:
+        counter = _counters.get(key)
+        if counter is None:
+            counter = TokenCounter(
+                lambda text: llm.tokenize(text.encode("utf-8"), add_bos=False),
+                lambda tokens: llm.detokenize(tokens).decode("utf-8", errors="ignore"),
+            )
+            _counters[key] = counter
+    return counter
+
+
+def counter_stats():
+    with _counters_lock:
+        return {os.path.basename(str(key)): counter.stats() for key, counter in _counters.items()}
+
+
+def _split_budget(demand, available, shares):
+    """Divide `available` tokens between sections by share, redistributing unused share."""
+    limits = {name: 0 for name in demand}
+    active = {name for name, need in demand.items() if need > 0}
+    while active:
+        remaining = available - sum(limits.values())
+        if remaining <= 0:
+            break
+        weight = sum(shares.get(name, 0) for name in active) or 1
+        grants = {name: int(remaining * shares.get(name, 0) / weight) for name in active}
+        satisfied = {name for name in active if demand[name] - limits[name] <= grants[name]}
+        if not satisfied:
+            for name in active:
+                limits[name] += grants[name]
+            break
+        for name in satisfied:
+            limits[name] = demand[name]
+        active -= satisfied
+    return limits
+
+
+def _take(counter, pieces, counts, limit, truncatable):
+    taken, used = [], 0
+    for piece, tokens in zip(pieces, counts):
+        if used + tokens <= limit:
+            taken.append(piece)
+            used += tokens
+            continue
+        if truncatable and limit - used >= MIN_PIECE_TOKENS:
+            taken.append(counter.truncate(piece, limit - used))
+            used = limit
+        break
+    return taken, used
+
+
+def allocate(counter, n_ctx, max_new_tokens, fixed_text, sections, shares=SECTION_SHARES):
+    """
+    Fit the prompt sections into the context window.
+
+    `fixed_text` is everything that must appear verbatim (system prompt,
+    template and user turn). `sections` maps a name to (pieces, truncatable)
+    or (pieces, truncatable, counts): pieces in priority order, of which only
+    whole pieces are kept unless `truncatable`, in which case the last one may
+    be cut at a token boundary. `counts` are the pieces' token counts if the
+    caller already knows them.
+
+    Returns (fitted, max_new_tokens, report) where `fitted` maps each section
+    to the pieces that fit and max_new_tokens may be lowered to make room.
+    """
+    fixed = counter.count(fixed_text) + SAFETY_MARGIN
+    if fixed + MIN_GENERATION_TOKENS > n_ctx:
+        raise PromptTooLongError(
+            f"Message is too long: {fixed} prompt tokens leave less than "
+            f"{MIN_GENERATION_TOKENS} tokens to answer in a {n_ctx}-token context")
+
+    generation = min(max_new_tokens, n_ctx - fixed)
+    available = n_ctx - fixed - generation
+    counts = {
+        name: section[2] if len(section) > 2 else [counter.count(p) for p in section[0]]
+        for name, section in sections.items()
+    }
+    demand = {name: sum(section_counts) for name, section_counts in counts.items()}
+    limits = _split_budget(demand, available, shares)
+
+    fitted, used = {}, {}
+    for name, (pieces, truncatable, *_) in sections.items():
+        fitted[name], used[name] = _take(counter, pieces, counts[name], limits[name], truncatable)
+
+    report = {"n_ctx": n_ctx, "fixed": fixed, "generation": generation, "demand": demand, "used": used}
+    return fitted, generation, report
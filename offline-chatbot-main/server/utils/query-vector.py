@@ -7,7 +7,7 @@ import warnings
 from langdetect import detect
 from sentence_transformers import SentenceTransformer
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-import faiss
+from vector_io import read_faiss_index
 
 warnings.filterwarnings("ignore")
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
@@ -61,7 +61,7 @@ model_embed = SentenceTransformer('sentence-transformers/distiluse-base-multilin
 VECTOR_INDEX_PATH = os.path.join("server", "vectorstore", "vector_index.faiss")
 TEXT_MAP_PATH = os.path.join("server", "vectorstore", "text_map.json")
 
-index = faiss.read_index(VECTOR_INDEX_PATH)
+index = read_faiss_index(VECTOR_INDEX_PATH)
 with open(TEXT_MAP_PATH, "r", encoding="utf-8") as f:
     texts = json.load(f)
 
@@ -1,26 +1,20 @@
-import json
-import numpy as np
-import faiss
 import os
+from vector_io import load_or_import, write_faiss_index
+from index_factory import build_index, INDEX_SPEC
 
 # === Path setup ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-VECTOR_JSON = os.path.join(BASE_DIR, "vector_index.json")
+VECTOR_FILE = os.path.join(BASE_DIR, "vector_index.vec")
+VECTOR_JSON = os.path.join(BASE_DIR, "vector_index.json")  # legacy, imported once
 FAISS_INDEX = os.path.join(BASE_DIR, "vector_index.faiss")
 
-# === Load vectors from vector_index.json ===
-with open(VECTOR_JSON, "r", encoding="utf-8") as f:
-    vectors = json.load(f)
-
-# === Convert to numpy float32 ===
-np_vectors = np.array(vectors, dtype="float32")
+# === Load vectors (memory-mapped float32) ===
+np_vectors = load_or_import(VECTOR_FILE, VECTOR_JSON)
 print(f"Loaded {np_vectors.shape[0]} vectors of dimension {np_vectors.shape[1]}")
 
 # === Create FAISS index ===
-dimension = np_vectors.shape[1]
-index = faiss.IndexFlatL2(dimension)
-index.add(np_vectors)
+index = build_index(np_vectors, INDEX_SPEC)
 
-# === Save index ===
-faiss.write_index(index, FAISS_INDEX)
+# === Save index (renamed into place: the server memory-maps it) ===
+write_faiss_index(index, FAISS_INDEX)
 print(f"✅ FAISS index saved at: {FAISS_INDEX}")
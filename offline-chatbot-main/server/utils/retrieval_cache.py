@@ -0,0 +1,72 @@
+# server/utils/retrieval_cache.py
+#
+# LRU cache for query embeddings and FAISS top-k results. Entries are keyed on
+# the index version, so rebuilding or swapping the index invalidates them.
+
+import os
+import threading
+from collections import OrderedDict
+
+from server.utils.translation_cache import normalize_text
+
+CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+
+
+class RetrievalCache:
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, query, k):
+        """Return (query_vector, distances, ids) or None."""
+        key = (normalize_text(query), k)
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version, query, k, vector, distances, ids):
+        key = (normalize_text(query), k)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (vector, distances, ids)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "index_version": str(self._version),
+            }
+
+
+retrieval_cache = RetrievalCache()
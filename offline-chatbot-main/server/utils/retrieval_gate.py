@@ -0,0 +1,108 @@
+# server/utils/retrieval_gate.py
+#
+# Decides per request whether FAISS context is good enough on its own or the
+# web has to be searched too (the slowest step of a request).
+#
+#   RETRIEVAL_POLICY=local_first  web only when the local hits are weak (default)
+#   RETRIEVAL_POLICY=always_web   web on every request (the old behaviour)
+#   RETRIEVAL_POLICY=local_only   never leave the box
+#
+# Local hits are strong when all of these hold (distances are the index's
+# squared L2 distances, so lower is better):
+#   best hit distance        <= GATE_TOP_DISTANCE
+#   margin                   >= GATE_MIN_MARGIN    worst - best distance of the
+#                                                   top k; all hits equally far
+#                                                   means nothing matched well
+#   coverage                 >= GATE_MIN_COVERAGE  tokens of hits within
+#                                                   GATE_MAX_DISTANCE / FAISS
+#                                                   share of the prompt budget
+#
+# Weak FAISS hits are still good enough when BM25 finds a chunk containing
+# (idf-weighted) at least GATE_MIN_LEXICAL of the query's words: exact codes
+# and names that the embedding does not capture.
+
+import os
+import threading
+
+RETRIEVAL_POLICY = os.getenv("RETRIEVAL_POLICY", "local_first")
+GATE_TOP_DISTANCE = float(os.getenv("GATE_TOP_DISTANCE", "0.5"))
+GATE_MAX_DISTANCE = float(os.getenv("GATE_MAX_DISTANCE", "0.7"))
+GATE_MIN_MARGIN = float(os.getenv("GATE_MIN_MARGIN", "0.05"))
+GATE_MIN_COVERAGE = float(os.getenv("GATE_MIN_COVERAGE", "0.25"))
+GATE_MIN_LEXICAL = float(os.getenv("GATE_MIN_LEXICAL", "0.8"))
+
+POLICIES = ("local_first", "always_web", "local_only")
+
+
+class RetrievalGate:
+    def __init__(self, policy=RETRIEVAL_POLICY, top_distance=GATE_TOP_DISTANCE, max_distance=GATE_MAX_DISTANCE,
+                 min_margin=GATE_MIN_MARGIN, min_coverage=GATE_MIN_COVERAGE, min_lexical=GATE_MIN_LEXICAL):
+        if policy not in POLICIES:
+            raise ValueError(f"RETRIEVAL_POLICY must be one of {', '.join(POLICIES)}, not {policy!r}")
+        self.policy = policy
+        self.top_distance = top_distance
+        self.max_distance = max_distance
+        self.min_margin = min_margin
+        self.min_coverage = min_coverage
+        self.min_lexical = min_lexical
+        self._lock = threading.Lock()
+        self._counts = {}  # reason -> requests
+
+    def decide(self, distances, token_counts, budget, lexical=None):
+        """
+        Score FAISS hits (`distances` and `token_counts` per hit, best first)
+        against a FAISS context budget of `budget` tokens and return the
+        decision as a dict: use_web, reason and the scores it was based on.
+        `lexical` is the share of the query the best BM25 hit matched, if
+        there is a BM25 index.
+        """
+        best = distances[0] if distances else None
+        margin = distances[-1] - distances[0] if len(distances) > 1 else 0.0
+        confident = [tokens for d, tokens in zip(distances, token_counts) if d <= self.max_distance]
+        coverage = min(1.0, sum(confident) / budget) if budget > 0 else 0.0
+
+        if self.policy == "always_web":
+            use_web, reason = True, "policy"
+        elif self.policy == "local_only":
+            use_web, reason = False, "policy"
+        elif best is None:
+            use_web, reason = True, "no_hits"
+        elif best > self.top_distance:
+            use_web, reason = True, "far"
+        elif margin < self.min_margin:
+            use_web, reason = True, "flat"
+        elif coverage < self.min_coverage:
+            use_web, reason = True, "thin"
+        else:
+            use_web, reason = False, "confident"
+        if use_web and self.policy == "local_first" and lexical is not None and lexical >= self.min_lexical:
+            use_web, reason = False, "lexical"
+
+        with self._lock:
+            key = f"{'web' if use_web else 'local'}:{reason}"
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+        return {
+            "policy": self.policy,
+            "use_web": use_web,
+            "reason": reason,
+            "best_distance": round(float(best), 4) if best is not None else None,
+            "margin": round(float(margin), 4),
+            "coverage": round(coverage, 4),
+            "confident_hits": len(confident),
+            "lexical_match": round(float(lexical), 4) if lexical is not None else None,
+        }
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        local = sum(n for key, n in counts.items() if key.startswith("local:"))
+        return {
+            "policy": self.policy,
+            "decisions": counts,
+            "local_rate": round(local / total, 4) if total else 0.0,
+        }
+
+
+retrieval_gate = RetrievalGate()
@@ -0,0 +1,161 @@
+# server/utils/search_cache.py
+#
+# TTL cache for search-provider responses (SerpAPI, Google CSE).
+#
+#   age < ttl                  -> served from cache
+#   ttl <= age < ttl + stale   -> served stale, refreshed in the background
+#   older                      -> fetched synchronously
+#
+# Memory is bounded by an LRU; an optional SQLite file keeps entries across
+# restarts.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from server.utils.translation_cache import normalize_text
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_STALE = float(os.getenv("SEARCH_CACHE_STALE", "21600"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_DB = os.getenv("SEARCH_CACHE_DB")  # unset = memory only
+
+
+class SearchCache:
+    def __init__(self, ttl=SEARCH_CACHE_TTL, stale=SEARCH_CACHE_STALE,
+                 max_entries=SEARCH_CACHE_SIZE, db_path=SEARCH_CACHE_DB):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-refresh")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS search_results ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Search cache DB unavailable ({e}); using memory only")
+                self._db = None
+
+    @staticmethod
+    def make_key(provider, query, max_results):
+        return f"{provider}\x1f{max_results}\x1f{normalize_text(query).lower()}"
+
+    # -------------------- storage --------------------
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self._db is not None:
+            try:
+                row = self._db.execute(
+                    "SELECT value, stored_at FROM search_results WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                text, links = json.loads(row[0])
+                entry = ((text, links), row[1])
+                self._remember(key, entry)
+                return entry
+        return None
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _store(self, key, value):
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, (value, stored_at))
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO search_results (key, value, stored_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(list(value), ensure_ascii=False), stored_at),
+                    )
+                    # Drop rows that can no longer be served, even stale
+                    self._db.execute(
+                        "DELETE FROM search_results WHERE stored_at < ?",
+                        (stored_at - self.ttl - self.stale,),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Search cache write failed: {e}")
+
+    # -------------------- fetching --------------------
+    @staticmethod
+    def _cacheable(value):
+        # Only cache real results; errors / missing keys return no links
+        return bool(value and value[1])
+
+    def _fetch_and_store(self, key, fetch_fn):
+        value = fetch_fn()
+        if self._cacheable(value):
+            self._store(key, value)
+        return value
+
+    def _refresh(self, key, fetch_fn):
+        try:
+            self._fetch_and_store(key, fetch_fn)
+        except Exception as e:
+            print(f"⚠️ Background search refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_fetch(self, provider, query, max_results, fetch_fn):
+        """Return the (text, links) result for this search, calling `fetch_fn()` when needed."""
+        key = self.make_key(provider, query, max_results)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.time() - stored_at
+                if age < self.ttl:
+                    self.hits += 1
+                    return value
+                if age < self.ttl + self.stale:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._refresher.submit(self._refresh, key, fetch_fn)
+                    return value
+            self.misses += 1
+        return self._fetch_and_store(key, fetch_fn)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+                "refreshing": len(self._refreshing),
+                "ttl_seconds": self.ttl,
+                "persistent": self._db is not None,
+            }
+
+
+search_cache = SearchCache()
@@ -1,46 +1,29 @@
 import os
+import re
+import json
 import uuid
-import torch
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-from fastapi import FastAPI
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict
-from llama_cpp import Llama
-from langdetect import detect
-from mongo_db import store_chat
-from server.utils.mistral_interface import generate_answer
-
-# ==== Paths ====
-MODEL_PATH = "E:/llm/models/Meta-Llama-3-8B-Instruct.Q4_K_M.gguf"
-TRANSLATION_MODEL_INDIC_EN = "E:/llm/hf_models/indictrans2/indictrans2-indic-en-dist-200M"
-TRANSLATION_MODEL_EN_INDIC = "E:/llm/hf_models/indictrans2/indictrans2-en-indic-dist-200M"
-
-# ==== Language Mappings ====
-LANGUAGE_TAGS = {
-    "en": "eng_Latn",
-    "hi": "hin_Deva",
-    "bn": "ben_Beng",
-    "gu": "guj_Gujr",
-    "kn": "kan_Knda",
-    "ml": "mal_Mlym",
-    "mr": "mar_Deva",
-    "or": "ory_Orya",
-    "pa": "pan_Guru",
-    "ta": "tam_Taml",
-    "te": "tel_Telu",
-    "as": "asm_Beng",
-    "ur": "urd_Arab",
-    "kok": "kok_Deva",
-    "ne": "npi_Deva",
-    "mai": "mai_Deva",
-    "sd": "snd_Arab",
-    "sa": "san_Deva",
-    "doi": "doi_Deva",
-    "mni": "mni_Mtei",
-    "bho": "bho_Deva",
-    "ks": "kas_Arab",
-}
+from server.mongo_db import chat_log
+from server.utils.mistral_interface import generate_answer, stream_answer, embed_query, retrieve
+from server.utils.model_registry import loaded_models
+from server.utils.translation_cache import translation_cache
+from server.utils import language_router
+from server.utils.language_router import ENGLISH, detect_language, iso_code, to_english, from_english
+from server.utils.retrieval_cache import retrieval_cache
+from server.utils.search_cache import search_cache
+from server.utils.prompt_budget import counter_stats
+from server.utils.kv_cache import kv_cache
+from server.utils.inference_scheduler import scheduler, should_stop, QueueFullError, DeadlineExceeded, Cancelled
+from server.utils.llm_pool import backend_stats, close_backends
+from server.utils.conversation_store import conversation_store
+from server.utils.answer_cache import answer_cache
+from server.utils.retrieval_gate import retrieval_gate
 
 # ==== FastAPI App ====
 app = FastAPI()
@@ -58,125 +41,191 @@ class Message(BaseModel):
     content: str
 
 class ChatRequest(BaseModel):
-    conversationHistory: List[Message]
+    # Optional: without it the server uses its own history of conversation_id
+    conversationHistory: Optional[List[Message]] = None
     prompt: str
     model: Dict[str, str]
     systemMessage: Optional[str] = None
     images: Optional[List[str]] = []
     conversation_id: Optional[str] = None
 
-# ==== Load LLM ====
-print("🧠 Loading GGUF model from:", MODEL_PATH)
-llm = Llama(model_path=MODEL_PATH)
-print("✅ GGUF model loaded!")
-
-# ==== Load Translation Models ====
-print("🧠 Loading translation models...")
-tokenizer_en_indic = AutoTokenizer.from_pretrained(
-    TRANSLATION_MODEL_EN_INDIC,
-    local_files_only=True,
-    trust_remote_code=True
-)
-model_en_indic = AutoModelForSeq2SeqLM.from_pretrained(
-    TRANSLATION_MODEL_EN_INDIC,
-    local_files_only=True,
-    trust_remote_code=True
-)
+# ==== Model Status ====
+@app.get("/models")
+async def models_status():
+    return loaded_models()
 
-tokenizer_indic_en = AutoTokenizer.from_pretrained(
-    TRANSLATION_MODEL_INDIC_EN,
-    local_files_only=True,
-    trust_remote_code=True
-)
-model_indic_en = AutoModelForSeq2SeqLM.from_pretrained(
-    TRANSLATION_MODEL_INDIC_EN,
-    local_files_only=True,
-    trust_remote_code=True
+# ==== Shared Request Preparation ====
+def _prepare_chat(request: ChatRequest):
+    """Detect the language and translate the query to English once."""
+    user_message = request.prompt
+    src_lang_tag = detect_language(user_message)
+    print(f"🔍 Detected language: {src_lang_tag}")
+    english_query = to_english(user_message, src_lang_tag)
+    return user_message, iso_code(src_lang_tag), src_lang_tag, english_query
+
+def _has_history(request: ChatRequest, conversation_id: str):
+    if request.conversationHistory is not None:
+        return bool(request.conversationHistory)
+    return request.conversation_id is not None and conversation_store.has_history(conversation_id)
+
+def _cached_answer(request: ChatRequest, english_query: str, conversation_id: str):
+    """
+    (cached answer or None, query embedding or None if the query is not
+    cacheable). Answers are cached per system message, and never for turns
+    that follow earlier ones.
+    """
+    if not answer_cache.cacheable(english_query, request.images, _has_history(request, conversation_id)):
+        return None, None
+    query_vector = embed_query(english_query)
+    return answer_cache.get(query_vector, request.systemMessage or None), query_vector
+
+# Language detection, the inbound translation and the answer-cache lookup run
+# on this small lane before a request is queued, so a cache hit never waits
+# behind generations (or gets a 429 / 503) on the scheduler.
+PREP_WORKERS = int(os.getenv("PREP_WORKERS", "4"))
+_prep_lane = ThreadPoolExecutor(max_workers=PREP_WORKERS, thread_name_prefix="chat-prep")
+
+def _prepare(request: ChatRequest, conversation_id: str):
+    """Everything before retrieval; a cache hit is translated out and logged here too."""
+    user_message, detected_lang_code, src_lang_tag, english_query = _prepare_chat(request)
+    cached, query_vector = _cached_answer(request, english_query, conversation_id)
+    cached_reply = None
+    if cached is not None:
+        cached_reply = from_english(cached.answer, src_lang_tag)
+        conversation_store.log_turn(conversation_id, user_message, cached_reply, detected_lang_code)
+    return {
+        "user_message": user_message,
+        "detected_lang": detected_lang_code,
+        "src_lang_tag": src_lang_tag,
+        "english_query": english_query,
+        "query_vector": query_vector,
+        "cached": cached,
+        "cached_reply": cached_reply,
+    }
+
+async def _run_prepare(request: ChatRequest, conversation_id: str):
+    return await asyncio.get_running_loop().run_in_executor(_prep_lane, _prepare, request, conversation_id)
+
+def _cached_response(prepared: dict, conversation_id: str):
+    return {
+        "role": "assistant",
+        "reply": prepared["cached_reply"],
+        "detected_lang": prepared["detected_lang"],
+        "conversation_id": conversation_id,
+        "cached": True,
+        "sources": prepared["cached"].sources
+    }
+
+def _nothing_found(retrieval: dict):
+    return not retrieval["chunks"] and not retrieval["web_context"].strip()
+
+WEB_SOURCE = re.compile(r"^\[Page \d+\]: (\S+)", re.M)
+
+def _remember_answer(request: ChatRequest, query_vector, english_query: str, english_reply: str, web_context: str):
+    """Cache a complete English answer (not one cut short by a deadline or cancel)."""
+    if query_vector is None or should_stop() or not english_reply or english_reply == "Not available":
+        return
+    answer_cache.put(query_vector, english_query, english_reply, WEB_SOURCE.findall(web_context),
+                     system=request.systemMessage or None)
+
+def _client_history(request: ChatRequest):
+    """History sent by the client, if any (older clients send all of it every time)."""
+    if request.conversationHistory is None:
+        return None
+    return [msg.dict() for msg in request.conversationHistory]
+
+# Appended to the user's (English) question. FAISS and web context go into
+# their own prompt sections, where they are fitted to the token budget.
+SAFE_INSTRUCTION = (
+    "Answer using the context above. "
+    "If there is no relevant company data, reply only with 'Not available'."
 )
-print("✅ Translation models loaded!")
 
-# ==== Translation Function ====
-def translate_text(text: str, src_lang: str, tgt_lang: str) -> str:
-    # Skip translation if same language
-    if src_lang == tgt_lang:
-        return text
+# ==== Cache Statistics ====
+@app.get("/stats")
+async def cache_stats():
+    return {
+        "translation_cache": translation_cache.stats(),
+        "translations": language_router.stats(),
+        "retrieval_cache": retrieval_cache.stats(),
+        "search_cache": search_cache.stats(),
+        "token_counts": counter_stats(),
+        "kv_cache": kv_cache.stats(),
+        "scheduler": scheduler.stats(),
+        "llm": backend_stats(),
+        "answer_cache": answer_cache.stats(),
+        "retrieval": retrieval_gate.stats(),
+        "chat_log": chat_log.stats(),
+        "conversations": conversation_store.stats(),
+    }
 
-    # Only allow known language codes
-    valid_tags = set(LANGUAGE_TAGS.values())
-    if src_lang not in valid_tags:
-        src_lang = "eng_Latn"
-    if tgt_lang not in valid_tags:
-        tgt_lang = "eng_Latn"
+@app.on_event("shutdown")
+def _shutdown():
+    # Let queued and running requests finish before the process exits
+    _prep_lane.shutdown(wait=True)
+    scheduler.shutdown()
+    close_backends()
+    chat_log.close()  # after the scheduler, so the last requests' chats are written
 
-    try:
-        if src_lang == "eng_Latn":
-            tokenizer = tokenizer_en_indic
-            model = model_en_indic
-        else:
-            tokenizer = tokenizer_indic_en
-            model = model_indic_en
-
-        prefix = f"{src_lang}⇒{tgt_lang}: "
-        input_ids = tokenizer(prefix + text, return_tensors="pt").input_ids
-        output_ids = model.generate(input_ids, max_length=512)
-        return tokenizer.decode(output_ids[0], skip_special_tokens=True)
+# ==== Health ====
+@app.get("/health")
+async def health():
+    # Answered on the event loop, never queued behind model work
+    return {"status": "ok", "scheduler": scheduler.stats()}
 
-    except Exception as e:
-        print(f"❌ Translation failed: {e}")
-        return text
+def _busy(e: Exception):
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
 
 # ==== Chat Endpoint ====
 @app.post("/chat")
-async def chat(request: ChatRequest):
-    user_message = request.prompt
-
+async def chat(request: ChatRequest, http_request: Request):
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    prepared = await _run_prepare(request, conversation_id)
+    if prepared["cached"] is not None:
+        return _cached_response(prepared, conversation_id)
     try:
-        detected_lang_code = detect(user_message)
-        print(f"🔍 Detected language: {detected_lang_code}")
-        src_lang_tag = LANGUAGE_TAGS.get(detected_lang_code, "eng_Latn")
-    except Exception:
-        detected_lang_code = "en"
-        src_lang_tag = "eng_Latn"
-
-    # Fallback for invalid tags
-    if src_lang_tag not in LANGUAGE_TAGS.values():
-        src_lang_tag = "eng_Latn"
-
-    # Translate to English if needed
-    if src_lang_tag != "eng_Latn":
-        english_query = translate_text(user_message, src_lang_tag, "eng_Latn")
-    else:
-        english_query = user_message
-
-    # Web scraping/search
-    from server.utils.web_fetcher import fetch_web_results
-    scraped_content = fetch_web_results(english_query)
-
-    if not scraped_content.strip():
+        return await scheduler.run(_chat, request, conversation_id, prepared,
+                                   is_disconnected=http_request.is_disconnected)
+    except QueueFullError as e:
+        raise _busy(e)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Cancelled:
+        return Response(status_code=499)  # client went away; nobody reads this
+
+def _chat(request: ChatRequest, conversation_id: str, prepared: dict):
+    """The blocking /chat pipeline after _prepare(); runs on an inference worker."""
+    user_message, detected_lang_code = prepared["user_message"], prepared["detected_lang"]
+    src_lang_tag, english_query = prepared["src_lang_tag"], prepared["english_query"]
+    query_vector = prepared["query_vector"]
+
+    # FAISS first; the web only if the retrieval gate finds local hits weak
+    retrieval = retrieve(english_query, query_vector=query_vector)
+    decision = retrieval["decision"]
+    if _nothing_found(retrieval):
         print("⚠️ No relevant content found, skipping LLM to avoid guessing.")
-        conversation_id = request.conversation_id or str(uuid.uuid4())
-        store_chat(conversation_id, user_message, "Not available", detected_lang_code)
+        conversation_store.log_turn(conversation_id, user_message, "Not available", detected_lang_code, decision)
         return {
             "role": "assistant",
             "reply": "Not available",
             "detected_lang": detected_lang_code,
-            "conversation_id": conversation_id
+            "conversation_id": conversation_id,
+            "retrieval": decision
         }
 
-    safe_prompt = (
-        "Summarize the following information accurately. "
-        "If there is no relevant company data, reply only with 'Not available'.\n\n"
-        f"{scraped_content}"
-    )
-
     try:
         result = generate_answer(
-            user_query=safe_prompt,
-            lang="eng_Latn",  # Always send English to LLM
+            user_query=english_query,
+            instruction=SAFE_INSTRUCTION,
+            retrieval=retrieval,
+            lang=ENGLISH,  # Already translated; generate_answer must not translate again
             system_message=request.systemMessage,
             images=request.images,
-            conversation_history=[msg.dict() for msg in request.conversationHistory],
-            model_name=request.model.get("name", "Meta-Llama-3-8B-Instruct")
+            conversation_history=_client_history(request),
+            model_name=request.model.get("name", "Meta-Llama-3-8B-Instruct"),
+            # Only an id the client sent back has history or a KV state worth
+            # saving; a fresh one would just evict real conversations
+            conversation_id=request.conversation_id
         )
         response = result["reply"]
 
@@ -187,18 +236,138 @@ async def chat(request: ChatRequest):
             "detected_lang": detected_lang_code
         }
 
-    # Translate back if needed
-    if src_lang_tag != "eng_Latn":
-        final_reply = translate_text(response, "eng_Latn", src_lang_tag)
-    else:
-        final_reply = response
+    _remember_answer(request, query_vector, english_query, response, retrieval["web_context"])
 
-    conversation_id = request.conversation_id or str(uuid.uuid4())
-    store_chat(conversation_id, user_message, final_reply, detected_lang_code)
+    # The one outbound translation (a no-op for English)
+    final_reply = from_english(response, src_lang_tag)
+
+    conversation_store.log_turn(conversation_id, user_message, final_reply, detected_lang_code, decision)
 
     return {
         "role": "assistant",
         "reply": final_reply,
         "detected_lang": detected_lang_code,
-        "conversation_id": conversation_id
+        "conversation_id": conversation_id,
+        "retrieval": decision
     }
+
+# ==== Streaming Chat Endpoint (Server-Sent Events) ====
+# Sentence boundary for translated streaming: Latin/Devanagari/Urdu terminators
+SENTENCE_END = re.compile(r"(?<=[.!?।॥۔؟])\s+")
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _split_complete_sentences(buffer: str):
+    """Split `buffer` into (complete sentences, trailing partial sentence)."""
+    parts = SENTENCE_END.split(buffer)
+    if len(parts) == 1:
+        return [], buffer
+    return parts[:-1], parts[-1]
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Streams the reply as SSE. English replies are forwarded token by token;
+    other languages are forwarded one translated sentence at a time. The final
+    `done` event carries the full reply, conversation_id and detected_lang.
+    """
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    try:
+        prepared = await _run_prepare(request, conversation_id)
+    except Exception as e:
+        return _sse_response(iter([_sse("error", {"message": f"❌ Preparation error: {e}"})]))
+    if prepared["cached"] is not None:
+        text = prepared["cached_reply"]
+        return _sse_response(iter([_sse("token", {"text": text}),
+                                   _sse("done", _cached_response(prepared, conversation_id))]))
+
+    user_message, detected_lang_code = prepared["user_message"], prepared["detected_lang"]
+    src_lang_tag, english_query = prepared["src_lang_tag"], prepared["english_query"]
+    query_vector = prepared["query_vector"]
+
+    # Sync generator: the scheduler iterates it on an inference worker, so the
+    # blocking model calls below never stall the event loop.
+    def event_stream():
+        try:
+            retrieval = retrieve(english_query, query_vector=query_vector)
+        except Exception as e:
+            yield _sse("error", {"message": f"❌ Retrieval error: {e}"})
+            return
+
+        decision = retrieval["decision"]
+
+        def done(reply):
+            conversation_store.log_turn(conversation_id, user_message, reply, detected_lang_code, decision)
+            return _sse("done", {
+                "role": "assistant",
+                "reply": reply,
+                "detected_lang": detected_lang_code,
+                "conversation_id": conversation_id,
+                "retrieval": decision
+            })
+
+        if _nothing_found(retrieval):
+            print("⚠️ No relevant content found, skipping LLM to avoid guessing.")
+            yield _sse("token", {"text": "Not available"})
+            yield done("Not available")
+            return
+
+        translate_back = src_lang_tag != ENGLISH
+        emitted = []
+        english = []
+        pending = ""
+        try:
+            for piece in stream_answer(
+                user_query=english_query,
+                instruction=SAFE_INSTRUCTION,
+                retrieval=retrieval,
+                lang=ENGLISH,
+                system_message=request.systemMessage,
+                images=request.images,
+                conversation_history=_client_history(request),
+                model_name=request.model.get("name", "Meta-Llama-3-8B-Instruct"),
+                conversation_id=request.conversation_id  # see _chat
+            ):
+                english.append(piece)
+                if not translate_back:
+                    emitted.append(piece)
+                    yield _sse("token", {"text": piece})
+                    continue
+                sentences, pending = _split_complete_sentences(pending + piece)
+                for sentence in sentences:
+                    text = from_english(sentence, src_lang_tag) + " "
+                    emitted.append(text)
+                    yield _sse("token", {"text": text})
+        except Exception as e:
+            yield _sse("error", {"message": f"❌ LLM error: {e}"})
+            return
+
+        if translate_back and pending.strip():
+            text = from_english(pending, src_lang_tag)
+            emitted.append(text)
+            yield _sse("token", {"text": text})
+
+        _remember_answer(request, query_vector, english_query, "".join(english).strip(), retrieval["web_context"])
+        yield done("".join(emitted).strip())
+
+    try:
+        events = scheduler.stream(event_stream, is_disconnected=http_request.is_disconnected)
+    except QueueFullError as e:
+        raise _busy(e)
+
+    async def guarded():
+        try:
+            async for event in events:
+                yield event
+        except DeadlineExceeded as e:
+            yield _sse("error", {"message": f"❌ {e}"})
+
+    return _sse_response(guarded())
+
+def _sse_response(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
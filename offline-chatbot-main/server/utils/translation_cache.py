@@ -0,0 +1,147 @@
+# server/utils/translation_cache.py
+#
+# Two-tier cache in front of the IndicTrans2 models: a bounded in-memory LRU
+# and an optional SQLite file that survives restarts. Keys are built from the
+# source tag, target tag, model id and normalized text.
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "4096"))
+CACHE_DB_PATH = os.getenv("TRANSLATION_CACHE_DB")  # unset = memory only
+CACHE_DB_MAX_ROWS = int(os.getenv("TRANSLATION_CACHE_DB_MAX_ROWS", "200000"))
+CACHE_DB_MAX_AGE_DAYS = float(os.getenv("TRANSLATION_CACHE_DB_MAX_AGE_DAYS", "90"))  # 0 = no age limit
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """NFC-normalize and collapse whitespace so trivially different inputs share a key."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_key(src_lang, tgt_lang, model_id, text):
+    raw = "\x1f".join([src_lang or "auto", tgt_lang or "auto", model_id or "", normalize_text(text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    def __init__(self, max_entries=CACHE_SIZE, db_path=CACHE_DB_PATH,
+                 max_db_rows=CACHE_DB_MAX_ROWS, max_db_age_days=CACHE_DB_MAX_AGE_DAYS):
+        self.max_entries = max_entries
+        self.max_db_rows = max_db_rows
+        self.max_db_age = max_db_age_days * 86400
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS translations_created ON translations (created)")
+                self._prune()
+                self._db.commit()
+                print(f"✅ Translation cache persisted at {db_path}")
+            except sqlite3.Error as e:
+                print(f"⚠️ Translation cache DB unavailable ({e}); using memory only")
+                self._db = None
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self):
+        """Drop rows past the age limit, then the least recently used ones over the row cap."""
+        if self.max_db_age > 0:
+            self._db.execute("DELETE FROM translations WHERE created < ?", (time.time() - self.max_db_age,))
+        self._db.execute(
+            "DELETE FROM translations WHERE key IN "
+            "(SELECT key FROM translations ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_db_rows,),
+        )
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT value FROM translations WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Translation cache read failed: {e}")
+                    row = None
+                if row is not None:
+                    # `created` doubles as last-used time so the row cap evicts like the LRU
+                    try:
+                        self._db.execute("UPDATE translations SET created = ? WHERE key = ?", (time.time(), key))
+                        self._db.commit()
+                    except sqlite3.Error as e:
+                        print(f"⚠️ Translation cache write failed: {e}")
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO translations (key, value, created) VALUES (?, ?, ?)",
+                        (key, value, time.time()),
+                    )
+                    self._prune()
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Translation cache write failed: {e}")
+
+    def cached_translate(self, src_lang, tgt_lang, model_id, text, translate_fn):
+        """Return the cached translation of `text`, calling `translate_fn(text)` on a miss."""
+        if not text or not text.strip():
+            return text
+        key = make_key(src_lang, tgt_lang, model_id, text)
+        result = self.get(key)
+        if result is None:
+            result = translate_fn(text)
+            # Failed translations return the input unchanged; don't pin those
+            if result is not None and result != text:
+                self.put(key, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
+
+
+# Shared instance used by mistral_interface and translate.py
+translation_cache = TranslationCache()
@@ -0,0 +1,97 @@
+# server/utils/translation_engine.py
+#
+# Sentence-segmented, batched translation for the IndicTrans2 seq2seq models.
+# Long texts are split into sentences (script-aware), translated in padded
+# batches sorted by length, and reassembled in the original order, so replies
+# longer than the model's max_length are no longer silently truncated.
+
+import os
+import re
+import torch
+
+BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "8"))
+MAX_LENGTH = 512
+# Sentences longer than this (in characters) are split further at clause
+# boundaries / whitespace so that no single input overruns the model.
+MAX_SENTENCE_CHARS = 400
+
+# Sentence terminators: Latin . ! ?, Devanagari/Bengali/etc. danda । ॥,
+# Urdu/Arabic full stop ۔ and question mark ؟. A terminator only ends a
+# sentence when followed by whitespace, so "3.14" or "e.g.x" stay intact.
+SENTENCE_END = re.compile(r"(?<=[.!?।॥۔؟])\s+")
+CLAUSE_END = re.compile(r"(?<=[,;:،])\s+")
+
+
+def _split_long(sentence, max_chars=MAX_SENTENCE_CHARS):
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces, current = [], ""
+    for clause in CLAUSE_END.split(sentence):
+        if current and len(current) + len(clause) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {clause}" if current else clause
+    if current:
+        pieces.append(current)
+
+    # Clauses that are still too long are cut at word boundaries
+    result = []
+    for piece in pieces:
+        while len(piece) > max_chars:
+            cut = piece.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            result.append(piece[:cut])
+            piece = piece[cut:].lstrip()
+        if piece.strip():
+            result.append(piece.strip())
+    return result
+
+
+def split_sentences(text):
+    """
+    Split `text` into a list of lines, each a list of sentences.
+    Line structure is kept so the translation can be reassembled faithfully.
+    """
+    lines = []
+    for line in text.split("\n"):
+        sentences = []
+        for sentence in SENTENCE_END.split(line.strip()):
+            if sentence:
+                sentences.extend(_split_long(sentence))
+        lines.append(sentences)
+    return lines
+
+
+def translate_sentences(tokenizer, model, sentences, prefix="", batch_size=None, max_length=MAX_LENGTH):
+    """
+    Translate a flat list of sentences in padded batches.
+    Sentences are sorted by length so each batch pads as little as possible;
+    results are returned in the input order.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]), reverse=True)
+    results = [None] * len(sentences)
+
+    for start in range(0, len(order), batch_size):
+        batch_ids = order[start:start + batch_size]
+        batch = [prefix + sentences[i] for i in batch_ids]
+        inputs = tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=max_length)
+        with torch.no_grad():
+            outputs = model.generate(**inputs, max_length=max_length)
+        decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        for i, translated in zip(batch_ids, decoded):
+            results[i] = translated.strip()
+
+    return results
+
+
+def translate_batched(tokenizer, model, text, prefix="", batch_size=None, max_length=MAX_LENGTH):
+    """Translate arbitrarily long `text` sentence by sentence, keeping line breaks."""
+    lines = split_sentences(text)
+    flat = [sentence for line in lines for sentence in line]
+    if not flat:
+        return text
+
+    translated = iter(translate_sentences(tokenizer, model, flat, prefix, batch_size, max_length))
+    return "\n".join(" ".join(next(translated) for _ in line) for line in lines)
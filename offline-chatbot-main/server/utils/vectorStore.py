@@ -1,35 +1,18 @@
 import os
 import json
 import numpy as np
-import faiss
 from sentence_transformers import SentenceTransformer
-from docx import Document
-import fitz  # PyMuPDF
+from extraction import extract_files, list_uploads
+from index_factory import build_index, INDEX_SPEC
+from vector_io import write_faiss_index
+from chunker import chunk_documents
 
 def read_files_from_folder(folder_path):
     chunks = []
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            try:
-                if file.endswith(".json"):
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = json.load(f)
-                        chunks.append({"text": json.dumps(content, ensure_ascii=False), "source": file_path})
-                elif file.endswith(".txt"):
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        chunks.append({"text": f.read(), "source": file_path})
-                elif file.endswith(".docx"):
-                    doc = Document(file_path)
-                    full_text = "\n".join([para.text for para in doc.paragraphs])
-                    chunks.append({"text": full_text, "source": file_path})
-                elif file.endswith(".pdf"):
-                    pdf = fitz.open(file_path)
-                    full_text = "".join([page.get_text() for page in pdf])
-                    pdf.close()
-                    chunks.append({"text": full_text, "source": file_path})
-            except Exception as e:
-                print(f"❌ Error reading {file_path}: {e}")
+    for file_path, docs, error in extract_files(list_uploads(folder_path)):
+        if error:
+            print(f"❌ Error reading {file_path}: {error}")
+        chunks.extend(docs)
     return chunks
 
 def main():
@@ -47,18 +30,20 @@ def main():
     os.makedirs(CHUNKS_FOLDER, exist_ok=True)
     os.makedirs(VECTORSTORE_FOLDER, exist_ok=True)
 
+    model = SentenceTransformer('sentence-transformers/distiluse-base-multilingual-cased-v1')
+    chunks = chunk_documents(chunks, model.tokenizer, max_tokens=model.max_seq_length)
+    print(f"✂️ Split documents into {len(chunks)} chunks")
+
     with open(os.path.join(CHUNKS_FOLDER, "chunks.json"), "w", encoding="utf-8") as f:
         json.dump(chunks, f, ensure_ascii=False, indent=2)
 
     texts = [c["text"] for c in chunks]
     print("📊 Generating embeddings...")
-    model = SentenceTransformer('sentence-transformers/distiluse-base-multilingual-cased-v1')
     vectors = model.encode(texts, normalize_embeddings=True)
 
-    index = faiss.IndexFlatIP(vectors.shape[1])
-    index.add(np.array(vectors).astype("float32"))
+    index = build_index(np.array(vectors).astype("float32"), INDEX_SPEC, metric="ip")
 
-    faiss.write_index(index, os.path.join(VECTORSTORE_FOLDER, "vector_index.faiss"))
+    write_faiss_index(index, os.path.join(VECTORSTORE_FOLDER, "vector_index.faiss"))  # the server memory-maps it
     with open(os.path.join(VECTORSTORE_FOLDER, "text_map.json"), "w", encoding="utf-8") as f:
         json.dump(texts, f, ensure_ascii=False, indent=2)
 
@@ -0,0 +1,196 @@
+# server/utils/vector_io.py
+#
+# Binary on-disk vector store shared by every loader.
+#
+# Layout (little-endian):
+#   bytes 0..3    magic  b"VECF"
+#   bytes 4..7    format version (uint32)
+#   bytes 8..15   number of rows (uint64)
+#   bytes 16..19  dimension (uint32)
+#   bytes 20..63  reserved (zero)
+#   bytes 64..    row-major float32 matrix
+#
+# The matrix is memory-mapped on load, so opening the store costs no parsing
+# and no extra copies. JSON is only kept as an import/export format.
+# Index builds write row i for chunk id i, so the file stays addressable by id
+# even after incremental builds have removed some chunks from the index.
+
+import os
+import sys
+import json
+import struct
+import numpy as np
+
+MAGIC = b"VECF"
+VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<4sIQI")
+
+
+def _pack_header(rows, dim):
+    header = _HEADER.pack(MAGIC, VERSION, rows, dim)
+    return header + b"\0" * (HEADER_SIZE - len(header))
+
+
+def read_header(path):
+    """Return (rows, dim) stored in the header of a vector file."""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"❌ Vector file is truncated: {path}")
+    magic, version, rows, dim = _HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"❌ Not a vector file (bad magic): {path}")
+    if version != VERSION:
+        raise ValueError(f"❌ Unsupported vector file version {version}: {path}")
+    return rows, dim
+
+
+def write_vectors(path, vectors):
+    """Write a 2-D float matrix to `path` in the binary vector format."""
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    if vectors.ndim != 2:
+        raise ValueError(f"❌ Expected a 2-D matrix, got shape {vectors.shape}")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_pack_header(vectors.shape[0], vectors.shape[1]))
+        f.write(vectors.tobytes())
+    os.replace(tmp_path, path)
+
+
+class VectorAppender:
+    """
+    Append rows to a vector file in place, for builds that embed in batches.
+
+    The header row count is only advanced by flush(), so after a crash the
+    file still reads back as the rows up to the last flush. Pass `rows` to
+    reopen an existing file and keep only its first `rows` rows (resume);
+    without it the file is started afresh.
+    """
+
+    def __init__(self, path, dim, rows=None):
+        self.path = path
+        self.dim = int(dim)
+        if rows is None or not os.path.exists(path):
+            self._file = open(path, "wb")
+            self._file.write(_pack_header(0, self.dim))
+            self.rows = 0
+        else:
+            stored_rows, stored_dim = read_header(path)
+            if stored_dim != self.dim or stored_rows < rows:
+                raise ValueError(f"❌ Cannot resume {path}: has {stored_rows} x {stored_dim}, "
+                                 f"need {rows} x {self.dim}")
+            self._file = open(path, "r+b")
+            self._file.truncate(HEADER_SIZE + rows * self.dim * 4)
+            self.rows = rows
+        self._file.seek(0, os.SEEK_END)
+
+    def append(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"❌ Expected rows of dimension {self.dim}, got shape {vectors.shape}")
+        self._file.write(vectors.tobytes())
+        self.rows += vectors.shape[0]
+
+    def flush(self):
+        """Make the appended rows durable and visible to readers."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.seek(0)
+        self._file.write(_pack_header(self.rows, self.dim))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.seek(0, os.SEEK_END)
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def load_vectors(path, mmap=True):
+    """
+    Load the float32 matrix stored at `path`.
+
+    With `mmap=True` (default) the returned array is a read-only memory map,
+    so only the pages that are actually touched are read from disk.
+    """
+    rows, dim = read_header(path)
+    expected = HEADER_SIZE + rows * dim * 4
+    actual = os.path.getsize(path)
+    if actual < expected:
+        raise ValueError(f"❌ Vector file is truncated: {path} ({actual} < {expected} bytes)")
+    if rows == 0:
+        return np.empty((0, dim), dtype="float32")
+    if mmap:
+        return np.memmap(path, dtype="<f4", mode="r", offset=HEADER_SIZE, shape=(rows, dim))
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE)
+        return np.fromfile(f, dtype="<f4", count=rows * dim).reshape(rows, dim)
+
+
+def import_json(json_path, path):
+    """Convert a legacy vector_index.json (list of float lists) into the binary format."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        embeddings = json.load(f)
+    if not embeddings or not isinstance(embeddings, list):
+        raise ValueError(f"❌ {json_path} is empty or malformed.")
+    write_vectors(path, np.array(embeddings, dtype="float32"))
+    print(f"✅ Converted {json_path} -> {path}")
+
+
+def export_json(path, json_path):
+    """Export a binary vector file as the legacy JSON list of float lists."""
+    vectors = load_vectors(path)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(np.asarray(vectors).tolist(), f)
+    print(f"✅ Exported {vectors.shape[0]} vectors to {json_path}")
+
+
+def load_or_import(path, json_path=None, mmap=True):
+    """
+    Load vectors from the binary file, converting the legacy JSON file once
+    if the binary file does not exist yet.
+    """
+    if not os.path.exists(path):
+        if json_path and os.path.exists(json_path):
+            print(f"🔄 Binary vector store missing, importing {json_path} ...")
+            import_json(json_path, path)
+        else:
+            raise FileNotFoundError(f"❌ Vector file not found: {path}")
+    return load_vectors(path, mmap=mmap)
+
+
+def read_faiss_index(path, mmap=True):
+    """Read a FAISS index, memory-mapping it when the index type supports it."""
+    import faiss
+
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception as e:
+            print(f"⚠️ mmap load not supported for {path} ({e}), reading into memory")
+    return faiss.read_index(path)
+
+
+def write_faiss_index(index, path):
+    """
+    Write a FAISS index to a temporary file and rename it over `path`, so a
+    reader never sees (or memory-maps) a half-written index.
+    """
+    import faiss
+
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python vector_io.py import <vectors.json> <vectors.vec>")
+        print("       python vector_io.py export <vectors.vec> <vectors.json>")
+        sys.exit(1)
+    if sys.argv[1] == "import":
+        import_json(sys.argv[2], sys.argv[3])
+    else:
+        export_json(sys.argv[2], sys.argv[3])
@@ -1,20 +1,43 @@
 import os
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from server.utils.html_scraper import extract_text_from_url
+from server.utils.search_cache import search_cache
 
 # Load API keys from environment variables
 SERPAPI_KEY = "enter serpapi key here"
 CSE_API_KEY = "enter cse_api_key here"
 CSE_ID = os.getenv("CSE_ID")
 
+# ==== Concurrency settings ====
+WEB_DEADLINE_SECONDS = float(os.getenv("WEB_DEADLINE_SECONDS", "8"))
+SCRAPE_TOP_N = int(os.getenv("SCRAPE_TOP_N", "2"))
 
-def fetch_serpapi_results(query, max_results=5):
-    """Fetch search results from SerpAPI."""
+# One pooled keep-alive session shared by the search providers and the scraper
+http_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+http_session.mount("http://", _adapter)
+http_session.mount("https://", _adapter)
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="web-fetch")
+
+
+def fetch_serpapi_results(query, max_results=5, timeout=10):
+    """Fetch search results from SerpAPI (served from the TTL cache when possible)."""
+    return search_cache.get_or_fetch(
+        "serpapi", query, max_results, lambda: _query_serpapi(query, max_results, timeout)
+    )
+
+
+def _query_serpapi(query, max_results=5, timeout=10):
+    """Query SerpAPI directly."""
     if not SERPAPI_KEY:
         return "[SerpAPI key not set]", []
     try:
         print(f"[DEBUG] Query to SerpAPI: {query}")
-        response = requests.get(
+        response = http_session.get(
             "https://serpapi.com/search",
             params={
                 "q": query,
@@ -22,7 +45,7 @@ def fetch_serpapi_results(query, max_results=5):
                 "num": max_results,
                 "engine": "google"
             },
-            timeout=10
+            timeout=timeout
         )
         data = response.json()
         results = data.get("organic_results", [])
@@ -44,13 +67,20 @@ def fetch_serpapi_results(query, max_results=5):
         return f"[SerpAPI error: {e}]", []
 
 
-def fetch_cse_results(query, max_results=5):
-    """Fetch search results from Google Custom Search Engine."""
+def fetch_cse_results(query, max_results=5, timeout=10):
+    """Fetch search results from Google CSE (served from the TTL cache when possible)."""
+    return search_cache.get_or_fetch(
+        "cse", query, max_results, lambda: _query_cse(query, max_results, timeout)
+    )
+
+
+def _query_cse(query, max_results=5, timeout=10):
+    """Query Google Custom Search Engine directly."""
     if not CSE_API_KEY or not CSE_ID:
         return "[CSE key or ID not set]", []
     try:
         print(f"[DEBUG] Query to CSE: {query}")
-        response = requests.get(
+        response = http_session.get(
             "https://www.googleapis.com/customsearch/v1",
             params={
                 "q": query,
@@ -58,7 +88,7 @@ def fetch_cse_results(query, max_results=5):
                 "cx": CSE_ID,
                 "num": max_results
             },
-            timeout=10
+            timeout=timeout
         )
         data = response.json()
         results = data.get("items", [])
@@ -80,16 +110,46 @@ def fetch_cse_results(query, max_results=5):
         return f"[CSE error: {e}]", []
 
 
-def fetch_web_results(query, max_results=5) -> str:
+def _remaining(deadline):
+    return max(0.5, deadline - time.monotonic())
+
+
+def _scrape_page(url, timeout, deadline):
+    content = extract_text_from_url(url, timeout=timeout, session=http_session, deadline=deadline)
+    if not content.strip():
+        content = "[Empty or failed to extract meaningful content]"
+    return content
+
+
+def fetch_web_results(query, max_results=5, deadline_seconds=WEB_DEADLINE_SECONDS) -> str:
     """
     Fetch combined web search results using SerpAPI & CSE,
     scrape top pages, and return structured text.
+
+    Both providers are queried in parallel and the top pages are scraped
+    concurrently, all within one overall deadline. Page downloads stop
+    reading at the deadline, so they give their executor thread back;
+    anything else still running when it expires is abandoned.
     """
     print(f"\n🔍 Final Search Query: {query}\n")
-
-    # Step 1: Fetch results
-    serpapi_text, serpapi_links = fetch_serpapi_results(query, max_results)
-    cse_text, cse_links = fetch_cse_results(query, max_results)
+    deadline = time.monotonic() + deadline_seconds
+
+    # Step 1: Fetch results (both providers in parallel)
+    timeout = _remaining(deadline)
+    serpapi_future = _executor.submit(fetch_serpapi_results, query, max_results, timeout)
+    cse_future = _executor.submit(fetch_cse_results, query, max_results, timeout)
+    wait([serpapi_future, cse_future], timeout=_remaining(deadline))
+
+    if serpapi_future.done():
+        serpapi_text, serpapi_links = serpapi_future.result()
+    else:
+        serpapi_future.cancel()
+        serpapi_text, serpapi_links = "[SerpAPI error: deadline exceeded]", []
+    if cse_future.done():
+        cse_text, cse_links = cse_future.result()
+    else:
+        cse_future.cancel()
+        cse_text, cse_links = "[CSE error: deadline exceeded]", []
 
     # Step 2: Merge links (remove duplicates while preserving order)
     combined_links = list(dict.fromkeys(serpapi_links + cse_links))
@@ -117,15 +177,24 @@ def fetch_web_results(query, max_results=5) -> str:
     for i, link in enumerate(combined_links[:5]):
         print(f"  {i+1}. {link}")
 
-    # Step 3: Scrape top pages
-    extracted = []
-    for i, url in enumerate(combined_links[:2]):  # scrape only top 2 links
+    # Step 3: Scrape top pages concurrently
+    top_links = combined_links[:SCRAPE_TOP_N]
+    page_timeout = _remaining(deadline)
+    futures = []
+    for i, url in enumerate(top_links):
         print(f"\n🌐 Scraping Page {i+1}: {url}")
+        futures.append(_executor.submit(_scrape_page, url, page_timeout, deadline))
+    wait(futures, timeout=_remaining(deadline))
+
+    extracted = []
+    for i, (url, future) in enumerate(zip(top_links, futures)):
+        if not future.done():
+            future.cancel()  # only helps if still queued; a running one stops at the deadline
+            print(f"❌ Failed to scrape Page {i+1}: deadline exceeded")
+            extracted.append(f"[Page {i+1}]: {url}\n[ERROR: deadline exceeded]")
+            continue
         try:
-            content = extract_text_from_url(url)
-            if not content.strip():
-                content = "[Empty or failed to extract meaningful content]"
-            extracted.append(f"[Page {i+1}]: {url}\n{content}")
+            extracted.append(f"[Page {i+1}]: {url}\n{future.result()}")
             print(f"✅ Successfully scraped Page {i+1}")
         except Exception as e:
             print(f"❌ Failed to scrape Page {i+1}: {e}")
@@ -145,7 +214,7 @@ def fetch_web_results(query, max_results=5) -> str:
 ### 📄 CSE RESULTS ###
 {cse_text}
 
-### 📑 SCRAPED CONTENT (Top {min(2, len(combined_links))} pages) ###
+### 📑 SCRAPED CONTENT (Top {len(top_links)} pages) ###
 {extracted_text}
 
 ### ✅ END OF WEB RESULTS ###
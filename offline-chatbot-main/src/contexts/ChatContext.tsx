@@ -24,6 +24,37 @@ const PORT =
   (typeof process !== "undefined" && process.env?.VITE_PORT) ||
   "5005";
 
+// Parses a text/event-stream body and hands each event to `onEvent`.
+async function readEventStream(
+  res: Response,
+  onEvent: (event: string, data: any) => void
+): Promise<void> {
+  if (!res.body) throw new Error("Response has no body");
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      let data = "";
+      for (const line of rawEvent.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      if (data) onEvent(event, JSON.parse(data));
+      boundary = buffer.indexOf("\n\n");
+    }
+  }
+}
+
 interface Message {
   role: "user" | "assistant" | "system";
   content: string;
@@ -64,6 +95,8 @@ export function ChatProvider({ children }: { children: ReactNode }) {
   const [responseStreamLoading, setResponseStreamLoading] = useState(false);
   const [systemMessage, setSystemMessage] = useLocalStorage("systemMessage", "You are a helpful assistant.");
   const [conversationHistory, setConversationHistory] = useLocalStorage("conversationHistory", []);
+  // The server keeps the history of this conversation; requests only send the new turn
+  const [conversationId, setConversationId] = useLocalStorage("conversationId", null);
   const [userLang, setUserLang] = useState<string>("eng_Latn");
 
   const messagesEndRef = useRef<HTMLDivElement | null>(null);
@@ -72,15 +105,6 @@ export function ChatProvider({ children }: { children: ReactNode }) {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   }, []);
 
-  const getValidHistory = useCallback(() => {
-    return conversationHistory.filter(
-      (msg: Message) =>
-        msg.role &&
-        typeof msg.content === "string" &&
-        msg.content.trim().length > 0
-    );
-  }, [conversationHistory]);
-
   const handleDataQuery = useCallback(
     async (query: string) => {
       if (!currentModel) {
@@ -94,7 +118,7 @@ export function ChatProvider({ children }: { children: ReactNode }) {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
-            conversationHistory: getValidHistory(),
+            conversation_id: conversationId,
             prompt: query,
             model:
               typeof currentModel === "string"
@@ -111,6 +135,7 @@ export function ChatProvider({ children }: { children: ReactNode }) {
 
         const data = await res.json();
         console.log("📦 Backend response (handleDataQuery):", data);
+        if (data.conversation_id) setConversationId(data.conversation_id);
 
         setConversationHistory((prev: Message[]) => [
           ...prev,
@@ -125,7 +150,7 @@ export function ChatProvider({ children }: { children: ReactNode }) {
         setUploadedFiles([]);
       }
     },
-    [currentModel, systemMessage, getValidHistory, userLang, setConversationHistory, setUploadedFiles]
+    [currentModel, systemMessage, conversationId, userLang, setConversationHistory, setConversationId, setUploadedFiles]
   );
 
   const handleAskPrompt = useCallback(
@@ -166,11 +191,11 @@ export function ChatProvider({ children }: { children: ReactNode }) {
           ? uploadedDocuments.map((f: any) => f.content).join("\n") + "\n\n" + finalPrompt
           : finalPrompt;
 
-        const res = await fetch(`http://localhost:${PORT}/chat`, {
+        const res = await fetch(`http://localhost:${PORT}/chat/stream`, {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
-            conversationHistory: getValidHistory(),
+            conversation_id: conversationId,
             prompt: combinedPrompt,
             model:
               typeof currentModel === "string"
@@ -185,13 +210,26 @@ export function ChatProvider({ children }: { children: ReactNode }) {
           }),
         });
 
-        const data = await res.json();
-        console.log("📦 Backend response (handleAskPrompt):", data);
+        let streamed = "";
+        let finalReply: string | null = null;
+        await readEventStream(res, (event, data) => {
+          if (event === "token") {
+            streamed += data.text;
+            setResponseStream(streamed);
+          } else if (event === "done") {
+            console.log("📦 Backend response (handleAskPrompt):", data);
+            finalReply = data.reply;
+            if (data.conversation_id) setConversationId(data.conversation_id);
+          } else if (event === "error") {
+            throw new Error(data.message);
+          }
+        });
 
+        setResponseStream("");
         setConversationHistory((prev: Message[]) => [
           ...prev,
           { role: "user", content: finalPrompt },
-          { role: "assistant", content: data.reply },
+          { role: "assistant", content: finalReply ?? streamed },
         ]);
       } catch (error) {
         toast({ description: "Error fetching response." });
@@ -201,7 +239,7 @@ export function ChatProvider({ children }: { children: ReactNode }) {
         setUploadedFiles([]);
       }
     },
-    [prompt, uploadedFiles, currentModel, systemMessage, getValidHistory, userLang, setConversationHistory, setUploadedFiles]
+    [prompt, uploadedFiles, currentModel, systemMessage, conversationId, userLang, setConversationHistory, setConversationId, setUploadedFiles]
   );
 
   const handleKeyDown = useCallback(
@@ -216,11 +254,12 @@ export function ChatProvider({ children }: { children: ReactNode }) {
 
   const resetChat = useCallback(() => {
     setConversationHistory([]);
+    setConversationId(null);
     setUploadedFiles([]);
     setPrompt("");
     setResponseStream("");
     setResponseStreamLoading(false);
-  }, [setConversationHistory, setUploadedFiles]);
+  }, [setConversationHistory, setConversationId, setUploadedFiles]);
 
   useEffect(() => {
     const fetchModels = async () => {